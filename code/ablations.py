@@ -1,7 +1,15 @@
 # 6. ablations.py
 # Runs experiments with multiple budgets (2048, 4000, 8192).
 
-def run_with_budgets(run_func, budgets=[2048,4000,8192]):
+def run_with_budgets(run_func, budgets=[2048,4000,8192], batched=False):
+    """
+    batched=False: run_func(B) is called once per budget.
+    batched=True:  run_func(budgets) is called once and returns {B: result},
+                   so per-example work (scoring, summaries, solver) is shared.
+    """
+    if batched:
+        res = run_func(sorted(budgets))
+        return {B: res[B] for B in budgets}
     results = {}
     for B in budgets:
         res = run_func(B)
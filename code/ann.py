@@ -0,0 +1,98 @@
+# ann.py
+# Approximate nearest-neighbour search over L2-normalized segment embeddings (NumPy only).
+# IVF: spherical k-means splits the segments into n_lists cells; a query scores the
+# centroids, probes the n_probe best cells and re-ranks their members exactly with the
+# stored embeddings. n_probe is the recall/latency knob (n_probe = n_lists is exact search).
+# Layout mirrors SegmentIndex: CSR over cells (list_ptr / list_ids), saved as .npy files.
+
+import os
+
+import numpy as np
+
+ARRAYS = ("centroids", "list_ptr", "list_ids")
+CHUNK = 8192  # rows per assignment block (bounds the n x n_lists score matrix)
+
+
+class IVFIndex:
+    def __init__(self, centroids, list_ptr, list_ids, embeddings):
+        self.centroids = centroids
+        self.list_ptr = list_ptr
+        self.list_ids = list_ids
+        self.embeddings = embeddings  # not owned: the SegmentIndex embeddings
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, n_lists=None, n_iter=10, max_train=None, seed=0):
+        """Spherical k-means on (a sample of) the embeddings; n_lists defaults to ~sqrt(n)."""
+        n = len(embeddings)
+        n_lists = max(1, min(n, n_lists or int(np.sqrt(n)))) if n else 1
+        rng = np.random.default_rng(seed)
+        max_train = max_train or 256 * n_lists
+        train = embeddings[np.sort(rng.choice(n, max_train, replace=False))] if n > max_train else embeddings
+        train = np.asarray(train, dtype=np.float32)
+        if n == 0:
+            dim = embeddings.shape[1] if embeddings.ndim == 2 else 0
+            return cls(np.zeros((0, dim), np.float32), np.zeros(1, np.int64), np.zeros(0, np.int64), embeddings)
+
+        centroids = train[rng.choice(len(train), n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = _assign(train, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            counts = np.bincount(assign, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():  # restart empty cells on random training points
+                sums[empty] = train[rng.choice(len(train), int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+        assign = _assign(embeddings, centroids)
+        order = np.argsort(assign, kind="stable")
+        list_ptr = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+        return cls(centroids.astype(np.float32), list_ptr, order.astype(np.int64), embeddings)
+
+    def candidates(self, query_emb, n_probe=8):
+        """Segment ids in the n_probe cells closest to the query."""
+        q = _normalize(query_emb)
+        cell_scores = self.centroids @ q
+        n_probe = min(n_probe, self.n_lists)
+        if n_probe <= 0 or self.n_lists == 0:
+            return np.zeros(0, dtype=np.int64)
+        cells = np.argpartition(-cell_scores, n_probe - 1)[:n_probe]
+        return np.concatenate([self.list_ids[self.list_ptr[c]:self.list_ptr[c + 1]] for c in cells])
+
+    def search(self, query_emb, k=100, n_probe=8):
+        """(ids, cosine scores) of the approximate top-k, exactly re-ranked, best first."""
+        q = _normalize(query_emb)
+        cand = self.candidates(q, n_probe)
+        scores = np.asarray(self.embeddings[cand] @ q)
+        if len(cand) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            cand, scores = cand[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return cand[order], scores[order]
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, embeddings, mmap_mode="r"):
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+        return cls(embeddings=embeddings, **arrays)
+
+
+def _normalize(v):
+    v = np.asarray(v, dtype=np.float32).reshape(-1)
+    return v / max(float(np.linalg.norm(v)), 1e-12)
+
+
+def _assign(x, centroids):
+    out = np.empty(len(x), dtype=np.int64)
+    for start in range(0, len(x), CHUNK):
+        block = np.asarray(x[start:start + CHUNK], dtype=np.float32)
+        out[start:start + CHUNK] = np.argmax(block @ centroids.T, axis=1)
+    return out
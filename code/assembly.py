@@ -0,0 +1,121 @@
+# assembly.py
+# Prefix-cache-friendly prompt assembly.
+# The solvers return the selection in value-density order, which depends on the query, so
+# two queries on the same document share almost no prompt prefix and a serving-side KV
+# prefix cache cannot help. order_selection() reorders a selection:
+#   "selection" - as returned (value-density order)
+#   "document"  - document order, so queries selecting similar segments share long prefixes
+#   "core"      - a pinned core first (the (segment, rung) choices most recent queries on the
+#                 document also made, see CoreTracker), then the query-specific tail,
+#                 each in document order
+# PrefixCacheSimulator replays a stream of prompts through a block-level LRU prefix cache
+# (blocks are identified by their tokens and everything before them, as in paged KV caches)
+# and reports the hit rate and the prefill tokens saved.
+
+import threading
+from collections import Counter, OrderedDict, deque
+
+import numpy as np
+
+from utils import get_token_counter
+
+ORDERS = ("selection", "document", "core")
+
+
+def order_selection(ids, modes, order="document", core=None):
+    """(ids, modes) of a selection rearranged for `order`; core is a set of (id, mode) pairs."""
+    ids, modes = np.asarray(ids), np.asarray(modes)
+    if order == "selection" or not len(ids):
+        return ids, modes
+    if order not in ORDERS:
+        raise ValueError(f"unknown prompt order {order!r} (expected one of {ORDERS})")
+    pinned = np.zeros(len(ids), dtype=bool)
+    if order == "core" and core:
+        pinned = np.array([(i, m) in core for i, m in zip(ids.tolist(), modes.tolist())], dtype=bool)
+    perm = np.lexsort((ids, ~pinned))  # pinned first, then by document position
+    return ids[perm], modes[perm]
+
+
+class CoreTracker:
+    """
+    Per document key, the selections of the last `window` queries; core(key) is the set of
+    (id, mode) pairs chosen by at least `min_share` of them. Thread-safe; the least
+    recently used documents are dropped beyond max_documents.
+    """
+
+    def __init__(self, window=32, min_share=0.5, max_documents=1024):
+        self.window = window
+        self.min_share = min_share
+        self.max_documents = max_documents
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+
+    def core(self, key):
+        with self._lock:
+            history = self._history.get(key)
+            if not history:
+                return set()
+            counts = Counter(pair for selection in history for pair in selection)
+            return {pair for pair, c in counts.items() if c >= self.min_share * len(history)}
+
+    def observe(self, key, ids, modes):
+        selection = frozenset(zip(np.asarray(ids).tolist(), np.asarray(modes).tolist()))
+        with self._lock:
+            history = self._history.pop(key, None) or deque(maxlen=self.window)
+            history.append(selection)
+            self._history[key] = history
+            while len(self._history) > self.max_documents:
+                self._history.popitem(last=False)
+
+
+class PrefixCacheSimulator:
+    """
+    Block-level LRU prefix cache: a prompt reuses the cached blocks of its longest cached
+    prefix (whole blocks only) and then caches all its blocks. capacity is in blocks.
+    """
+
+    def __init__(self, block_size=16, capacity=4096):
+        self.block_size = block_size
+        self.capacity = capacity
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens = 0
+        self.hit_tokens = 0
+
+    def process(self, tokens):
+        """Serve one prompt (a token sequence); returns how many of its tokens were cache hits."""
+        bs = self.block_size
+        hit, parent, cached = 0, None, True
+        with self._lock:
+            for start in range(0, len(tokens) - bs + 1, bs):
+                parent = hash((parent, tuple(tokens[start:start + bs])))
+                if cached and parent in self._blocks:
+                    hit += bs
+                else:
+                    cached = False
+                self._blocks[parent] = True
+                self._blocks.move_to_end(parent)
+            while len(self._blocks) > self.capacity:
+                self._blocks.popitem(last=False)
+            self.requests += 1
+            self.tokens += len(tokens)
+            self.hit_tokens += hit
+        return hit
+
+    def replay(self, prompts, counter=None):
+        """Tokenize prompts with the budget token counter and serve them in order."""
+        counter = counter or get_token_counter()
+        for tokens in counter.encode(prompts):
+            self.process(tokens)
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "tokens": self.tokens,
+                "saved_tokens": self.hit_tokens,
+                "hit_rate": self.hit_tokens / self.tokens if self.tokens else 0.0,
+                "prefill_tokens": self.tokens - self.hit_tokens,
+            }
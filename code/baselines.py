@@ -1,45 +1,80 @@
 # 3. baselines.py
 # Implements all baselines.
+# Every baseline also accepts a SegmentTable (segment_table.py) in place of the
+# segment / summary list: costs then come from the table's columns and the
+# output text is gathered from its buffer by index.
 
-from utils import count_tokens
+import numpy as np
+
+from segment_table import SegmentTable
+from utils import count_tokens, count_tokens_batch, truncate_tokens
+
+def _join(segments):
+    if isinstance(segments, SegmentTable):
+        return segments.gather(np.arange(len(segments)))
+    return " ".join(segments)
 
 def full_context(segments, B):
-    text = " ".join(segments)
-    return text[:B], count_tokens(text)
+    """Full document cut at B tokens; also reports the full (untruncated) length."""
+    text = _join(segments)
+    return truncate_tokens(text, B)[0], count_tokens(text)
 
 def truncation(segments, B):
-    text = " ".join(segments)
-    words = text.split()[:B]
-    return " ".join(words), len(words)
+    text = _join(segments)
+    return truncate_tokens(text, B)
 
-def retrieval_topk(segments, importance, B, k=5):
-    ranked = sorted(list(zip(segments, importance)), key=lambda x: x[1], reverse=True)
+def _fill(texts, costs, B):
     chosen = []
     total = 0
-    for seg, score in ranked[:k]:
-        cost = count_tokens(seg)
+    for t, cost in zip(texts, costs):
         if total + cost <= B:
-            chosen.append(seg)
+            chosen.append(t)
             total += cost
     return " ".join(chosen), total
 
+def _fill_table(table, ids, costs, B, mode=None):
+    """_fill over table rows `ids`; text is one gather from the buffer."""
+    chosen, total = [], 0
+    for i, cost in zip(ids.tolist(), costs.tolist()):
+        if total + cost <= B:
+            chosen.append(i)
+            total += cost
+    modes = None if mode is None else np.full(len(chosen), mode)
+    return table.gather(np.asarray(chosen, dtype=np.int64), modes), total
+
+def _topk(scores, k):
+    """Indices of the k highest scores, best first, ties in index order (as a stable
+    descending sort) - via argpartition, so O(n + k log k) instead of O(n log n)."""
+    scores = np.asarray(scores, dtype=np.float64)
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    top = np.concatenate([above, ties])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+def retrieval_topk(segments, importance, B, k=5):
+    top = _topk(importance, k)
+    if isinstance(segments, SegmentTable):
+        return _fill_table(segments, top, segments.seg_costs[top], B)
+    top = [segments[i] for i in top]
+    return _fill(top, count_tokens_batch(top), B)
+
 def all_summaries(summaries, B):
-    chosen = []
-    total = 0
-    for s in summaries:
-        c = count_tokens(s)
-        if total + c <= B:
-            chosen.append(s)
-            total += c
-    return " ".join(chosen), total
+    """Summaries in document order; given a SegmentTable, its summary column."""
+    if isinstance(summaries, SegmentTable):
+        return _fill_table(summaries, np.arange(len(summaries)), summaries.sum_costs, B,
+                           mode=summaries.rung_index("summary"))
+    return _fill(summaries, count_tokens_batch(summaries), B)
 
 def oracle_selection(segments, answers, B):
     """Oracle includes segments that contain gold answer string."""
-    chosen, total = [], 0
-    for seg in segments:
-        if any(ans in seg for ans in answers):
-            c = count_tokens(seg)
-            if total + c <= B:
-                chosen.append(seg)
-                total += c
-    return " ".join(chosen), total
+    if isinstance(segments, SegmentTable):
+        hits = np.asarray([i for i, seg in enumerate(segments) if any(ans in seg for ans in answers)],
+                          dtype=np.int64)
+        return _fill_table(segments, hits, segments.seg_costs[hits], B)
+    hits = [seg for seg in segments if any(ans in seg for ans in answers)]
+    return _fill(hits, count_tokens_batch(hits), B)
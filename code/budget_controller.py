@@ -0,0 +1,79 @@
+# budget_controller.py
+# Adaptive per-query budget: the smallest budget between a floor and a ceiling at which
+# more tokens stop paying off. Every budget of a geometric grid is solved at once with the
+# multi-budget solvers (select_table_multi / lazy_select share one DP table or one greedy
+# pass), then the grid is scanned from the floor up and stops at the first budget where
+#   - flat: the marginal gain to the next grid budget, per token, is below flat_ratio of the
+#           average value per token at this budget (the value curve has flattened out), or
+#   - mass: the selected value covers `mass` of the document's positive importance (the
+#           answer mass is already in the prompt).
+# Otherwise the ceiling is used. choose_budgets() serves several ceilings from one grid
+# (up to the largest ceiling) and one multi-budget solve.
+
+import numpy as np
+
+DEFAULT_FLOOR = 512
+DEFAULT_CEILING = 8192
+
+
+def budget_grid(floor=DEFAULT_FLOOR, ceiling=DEFAULT_CEILING, n_steps=8):
+    """Geometrically spaced integer budgets from floor to ceiling (both included)."""
+    floor, ceiling = int(min(floor, ceiling)), int(ceiling)
+    return sorted(set(int(round(b)) for b in np.geomspace(max(floor, 1), max(ceiling, 1), n_steps)))
+
+
+def choose_budget(select_multi, importance_scores, floor=DEFAULT_FLOOR, ceiling=DEFAULT_CEILING, n_steps=8,
+                  flat_ratio=0.05, mass=0.9):
+    """
+    select_multi(budgets) -> {B: (ids, modes, cost, value, ...)}, e.g.
+    functools.partial(select_table_multi, table, method="fptas").
+    Returns (budget, selection at that budget, report) where report holds the chosen
+    budget, the criterion that fired, the importance coverage and the (budget, value) grid.
+    """
+    return choose_budgets(select_multi, importance_scores, [ceiling], floor=floor, n_steps=n_steps,
+                          flat_ratio=flat_ratio, mass=mass)[ceiling]
+
+
+def choose_budgets(select_multi, importance_scores, ceilings, floor=DEFAULT_FLOOR, n_steps=8,
+                   flat_ratio=0.05, mass=0.9):
+    """
+    choose_budget for several ceilings: {ceiling: (budget, selection, report)}. One grid
+    from the floor to the largest ceiling (plus every ceiling) is solved once; each
+    ceiling scans the grid budgets up to itself.
+    """
+    ceilings = sorted(set(int(c) for c in ceilings))
+    if not ceilings:
+        return {}
+    grid = sorted(set(budget_grid(floor, ceilings[-1], n_steps)) | set(ceilings))
+    results = select_multi(grid)
+    values = {B: float(results[B][3]) for B in grid}
+    importance = np.asarray(importance_scores, dtype=np.float64)
+    total = float(importance[importance > 0].sum())
+    chosen = {}
+    for ceiling in ceilings:
+        sub = [B for B in grid if min(floor, ceiling) <= B <= ceiling]
+        pos, reason = _scan(sub, np.array([values[B] for B in sub]), total, flat_ratio, mass)
+        B = sub[pos]
+        report = {
+            "budget": B,
+            "reason": reason,
+            "cost": int(results[B][2]),
+            "value": values[B],
+            "coverage": values[B] / total if total > 0 else 0.0,
+            "grid": [(b, values[b]) for b in sub],
+        }
+        chosen[ceiling] = (B, results[B], report)
+    return chosen
+
+
+def _scan(grid, values, total, flat_ratio, mass):
+    """(position in grid, reason) of the first budget that satisfies a stopping criterion."""
+    if values[-1] <= 0:
+        return 0, "no_value"
+    for i in range(len(grid) - 1):  # reaching the ceiling is reported as such
+        if total > 0 and values[i] >= mass * total:
+            return i, "mass"
+        slope = (values[i + 1] - values[i]) / (grid[i + 1] - grid[i])
+        if values[i] > 0 and slope < flat_ratio * values[i] / grid[i]:
+            return i, "flat"
+    return len(grid) - 1, "ceiling"
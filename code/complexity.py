@@ -1,12 +1,152 @@
 # 8. complexity.py
-# Benchmarks runtime.
+# Benchmarks runtime: times each pipeline stage (segmentation, scoring, summarization,
+# selection, baselines) while sweeping #segments, segment length and budget, fits
+# empirical scaling exponents, and writes machine-readable JSON for regression checks.
+# use_stubs=True swaps the model-backed stages for local stand-ins (see stubs.py).
 
+import contextlib
+import json
+import platform
 import time
+import tracemalloc
+from functools import partial
+
 import numpy as np
 
-def measure_complexity(n_segments=1000):
-    data = ["segment text " + str(i) for i in range(n_segments)]
-    start = time.time()
-    sorted(data, key=lambda x: len(x))
-    end = time.time()
-    return {"n": n_segments, "runtime": end-start, "complexity": "O(n log n)"}
+STAGES = ["segment_text", "compute_importance", "summarize_segments", "budgeted_selection",
+          "full_context", "truncation", "retrieval_topk", "all_summaries"]
+
+_VOCAB = ("budget prefill token segment summary query model context answer report "
+          "government agency policy data result method value cost memory latency").split()
+
+
+def synthetic_document(n_segments, seg_len, seed=0):
+    """n_segments sentences of seg_len words each."""
+    rng = np.random.default_rng(seed)
+    words = rng.choice(_VOCAB, size=(n_segments, seg_len))
+    return " ".join(" ".join(row).capitalize() + "." for row in words)
+
+
+def _measure(fn, repeat):
+    """Best-of-repeat wall time, then one traced run for peak Python/NumPy memory."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def bench_stages(n_segments, seg_len, budget, repeat=3, method="greedy", summary_batch_size=None):
+    """Time every stage once on a synthetic document; caches are bypassed."""
+    from segmentation import segment_text
+    from selection import budgeted_selection
+    from baselines import full_context, truncation, retrieval_topk, all_summaries
+    from segment_index import SegmentIndex
+    import scoring
+
+    doc = synthetic_document(n_segments, seg_len)
+    query = "what is the cost of the prefill budget"
+    segments = segment_text(doc)
+
+    def importance():
+        index = SegmentIndex.build(segments, scoring.embedder.encode, scoring.bm25_tokenizer)
+        return index.score(query, scoring.embedder.encode, scoring.bm25_tokenizer)
+
+    imp = importance()
+    summaries = scoring.summarize_segments(segments, cache=None, batch_size=summary_batch_size)
+    stage_fns = {
+        "segment_text": lambda: segment_text(doc),
+        "compute_importance": importance,
+        "summarize_segments": lambda: scoring.summarize_segments(segments, cache=None,
+                                                                 batch_size=summary_batch_size),
+        "budgeted_selection": lambda: budgeted_selection(segments, summaries, imp, budget, method=method),
+        "full_context": lambda: full_context(segments, budget),
+        "truncation": lambda: truncation(segments, budget),
+        "retrieval_topk": lambda: retrieval_topk(segments, imp, budget, k=5),
+        "all_summaries": lambda: all_summaries(summaries, budget),
+    }
+    row = {"n_segments": len(segments), "seg_len": seg_len, "budget": budget, "stages": {}}
+    for name in STAGES:
+        seconds, peak = _measure(stage_fns[name], repeat)
+        row["stages"][name] = {
+            "seconds": seconds,
+            "segments_per_s": len(segments) / seconds if seconds > 0 else None,
+            "peak_kib": peak / 1024,
+        }
+    return row
+
+
+def fit_exponent(xs, seconds):
+    """Slope of log(time) vs log(x): runtime ~ x^k."""
+    xs, seconds = np.asarray(xs, dtype=float), np.asarray(seconds, dtype=float)
+    ok = (xs > 0) & (seconds > 0)
+    if ok.sum() < 2:
+        return None
+    return float(np.polyfit(np.log(xs[ok]), np.log(seconds[ok]), 1)[0])
+
+
+def _exponents(rows, axis):
+    xs = [r[axis] for r in rows]
+    return {name: fit_exponent(xs, [r["stages"][name]["seconds"] for r in rows]) for name in STAGES}
+
+
+def run_benchmarks(n_segments=(100, 200, 400, 800), seg_lengths=(10, 20, 40), budgets=(512, 2048, 8192),
+                   base_n=200, base_len=20, base_budget=2048, repeat=3, method="greedy",
+                   use_stubs=True, out_path="bench_results.json", summary_batch_size=None):
+    """Sweep each axis with the other two at their base value; returns (and saves) the report.
+    With use_stubs the stand-in models are only installed for the duration of the sweep;
+    summary_batch_size is passed to summarize_segments (None: one segment per call)."""
+    if use_stubs:
+        from stubs import stubbed_models
+        models = stubbed_models()
+    else:
+        models = contextlib.nullcontext()
+
+    bench = partial(bench_stages, repeat=repeat, method=method, summary_batch_size=summary_batch_size)
+    with models:
+        sweeps = {
+            "n_segments": [bench(n, base_len, base_budget) for n in n_segments],
+            "seg_len": [bench(base_n, L, base_budget) for L in seg_lengths],
+            "budget": [bench(base_n, base_len, B) for B in budgets],
+        }
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "stubs": use_stubs,
+            "method": method,
+            "summary_batch_size": summary_batch_size,
+            "repeat": repeat,
+        },
+        "sweeps": sweeps,
+        "exponents": {axis: _exponents(rows, axis) for axis, rows in sweeps.items()},
+    }
+    if out_path:
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+def measure_complexity(n_segments=1000, use_stubs=True):
+    """Pipeline runtime at n_segments, with the empirical exponent from a 3-point sweep."""
+    report = run_benchmarks(n_segments=(n_segments // 4, n_segments // 2, n_segments), seg_lengths=(),
+                            budgets=(), repeat=1, use_stubs=use_stubs, out_path=None)
+    rows = report["sweeps"]["n_segments"]
+    totals = [sum(s["seconds"] for s in r["stages"].values()) for r in rows]
+    k = fit_exponent([r["n_segments"] for r in rows], totals)
+    return {"n": n_segments, "runtime": totals[-1], "complexity": f"O(n^{k:.2f})" if k is not None else "n/a",
+            "stages": rows[-1]["stages"]}
+
+
+if __name__ == "__main__":
+    result = run_benchmarks()
+    for axis, exps in result["exponents"].items():
+        print(axis, {k: (round(v, 2) if v is not None else None) for k, v in exps.items()})
+    print("[INFO] Benchmark results saved to bench_results.json")
@@ -1,24 +1,116 @@
 # 2. datasets.py
 # Handles dataset loading (HotpotQA, TriviaQA, GovReport, ArXiv).
+#
+# iter_* functions are generators over an Arrow-backed (memory-mapped) split, so
+# examples are produced one at a time in bounded memory. A local copy is used when
+# available: set BPO_DATA_DIR (or pass local_dir) to a directory laid out as
+#   <local_dir>/<dataset name with "/" -> "__">/<config or "default">/<split>/
+# holding *.parquet or *.jsonl files (one row per line) or a `save_to_disk` Arrow
+# dataset. Splits fetched from the Hub are saved there, so later runs work offline.
+# load_* keep the original list-returning API.
+
+import glob
+import os
+
+from utils import content_hash
+
+DATA_DIR = os.environ.get("BPO_DATA_DIR")
+
+
+def _local_path(local_dir, name, config, split):
+    return os.path.join(local_dir, name.replace("/", "__"), config or "default", split)
+
+
+def open_split(name, config, split, local_dir=None, columns=None):
+    """Arrow dataset for one split, preferring (and populating) the local copy."""
+    from datasets import load_dataset, load_from_disk
+    local_dir = local_dir or DATA_DIR
+    path = _local_path(local_dir, name, config, split) if local_dir else None
+    if path and os.path.isdir(path):
+        parquet = sorted(glob.glob(os.path.join(path, "*.parquet")))
+        jsonl = sorted(glob.glob(os.path.join(path, "*.jsonl")))
+        if parquet:
+            ds = load_dataset("parquet", data_files=parquet, split="train")
+        elif jsonl:
+            ds = load_dataset("json", data_files=jsonl, split="train")
+        else:
+            ds = load_from_disk(path)
+    else:
+        ds = load_dataset(name, config, split=split) if config else load_dataset(name, split=split)
+        if path:
+            ds.save_to_disk(path)
+    if columns:
+        ds = ds.select_columns([c for c in columns if c in ds.column_names])
+    return ds
+
+
+def iter_split(name, config, split, n=None, local_dir=None, columns=None, num_shards=1, shard_index=0):
+    """Lazily yield raw rows; with num_shards > 1 only this worker's contiguous shard."""
+    ds = open_split(name, config, split, local_dir=local_dir, columns=columns)
+    if num_shards > 1:
+        ds = ds.shard(num_shards=num_shards, index=shard_index, contiguous=True)
+    if n is not None:
+        ds = ds.select(range(min(n, len(ds))))
+    for ex in ds:
+        yield ex
+
+
+def _hotpot_context(context):
+    """Join HotpotQA paragraphs; HF stores {"title": [...], "sentences": [[...], ...]}."""
+    paragraphs = context["sentences"] if isinstance(context, dict) else [p[1] for p in context]
+    return " ".join(" ".join(sents) for sents in paragraphs)
+
+
+def iter_hotpotqa(n=None, split="validation", **kwargs):
+    """
+    Stream HotpotQA (distractor setting) examples.
+    Yields: dicts {id, query, context, answer}
+    """
+    for ex in iter_split("hotpot_qa", "distractor", split, n=n,
+                         columns=["id", "question", "context", "answer"], **kwargs):
+        # concatenate all context paragraphs (per example, on demand)
+        yield {"id": ex["id"], "query": ex["question"], "context": _hotpot_context(ex["context"]),
+               "answer": ex["answer"]}
+
+
+def iter_triviaqa(n=None, split="validation", **kwargs):
+    """
+    Stream TriviaQA (Wikipedia setting) examples.
+    Yields: dicts {id, query, context, answer}
+    """
+    for ex in iter_split("trivia_qa", "rc", split, n=n,
+                         columns=["question_id", "question", "entity_pages", "answer"], **kwargs):
+        # concatenate all candidate evidence docs
+        context = " ".join(ex["entity_pages"]["wiki_context"]) if "entity_pages" in ex else ""
+        ans = ex["answer"]["value"] if "answer" in ex else ""
+        yield {"id": ex["question_id"], "query": ex["question"], "context": context, "answer": ans}
+
+
+def iter_govreport(n=None, split="test", **kwargs):
+    """
+    Stream GovReport Summarization examples.
+    Yields: dicts {id, report, summary}
+    """
+    for ex in iter_split("ccdv/govreport-summarization", None, split, n=n, **kwargs):
+        # fields are "report" and "summary"; no id column, so the report hash serves as id
+        yield {"id": content_hash(ex["report"])[:16], "report": ex["report"], "summary": ex["summary"]}
+
+
+def iter_arxiv(n=None, split="test", **kwargs):
+    """
+    Stream ArXiv Summarization examples.
+    Yields: dicts {id, report, summary}
+    """
+    for ex in iter_split("ccdv/arxiv-summarization", None, split, n=n, **kwargs):
+        yield {"id": content_hash(ex["article"])[:16], "report": ex["article"], "summary": ex["abstract"]}
 
-import json
-import random
-from datasets import load_dataset
 
 def load_hotpotqa(n=50):
     """
     Load HotpotQA (distractor setting) subset from Hugging Face.
     Returns: list of dicts {query, context, answer}
     """
-    dataset = load_dataset("hotpot_qa", "distractor", split=f"validation[:{n}]")
-    data = []
-    for ex in dataset:
-        q = ex["question"]
-        # concatenate all context paragraphs
-        context = " ".join([" ".join(p) for p in ex["context"]])
-        ans = ex["answer"]
-        data.append({"query": q, "context": context, "answer": ans})
-    return data
+    return list(iter_hotpotqa(n=n))
 
 
 def load_triviaqa(n=50):
@@ -26,15 +118,7 @@ def load_triviaqa(n=50):
     Load TriviaQA (Wikipedia setting) subset from Hugging Face.
     Returns: list of dicts {query, context, answer}
     """
-    dataset = load_dataset("trivia_qa", "rc", split=f"validation[:{n}]")
-    data = []
-    for ex in dataset:
-        q = ex["question"]
-        # concatenate all candidate evidence docs
-        context = " ".join(ex["entity_pages"]["wiki_context"]) if "entity_pages" in ex else ""
-        ans = ex["answer"]["value"] if "answer" in ex else ""
-        data.append({"query": q, "context": context, "answer": ans})
-    return data
+    return list(iter_triviaqa(n=n))
 
 
 def load_govreport(n=20):
@@ -42,12 +126,7 @@ def load_govreport(n=20):
     Load GovReport Summarization dataset from Hugging Face.
     Returns: list of dicts {report, summary}
     """
-    dataset = load_dataset("ccdv/govreport-summarization", split=f"test[:{n}]")
-    data = []
-    for ex in dataset:
-        # fields are "report" and "summary"
-        data.append({"report": ex["report"], "summary": ex["summary"]})
-    return data
+    return list(iter_govreport(n=n))
 
 
 def load_arxiv(n=20):
@@ -55,11 +134,4 @@ def load_arxiv(n=20):
     Load ArXiv Summarization dataset from Hugging Face.
     Returns: list of dicts {report, summary}
     """
-    dataset = load_dataset("ccdv/arxiv-summarization", split=f"test[:{n}]")
-    data = []
-    for ex in dataset:
-        data.append({"report": ex["article"], "summary": ex["abstract"]})
-    return data
-
-
-
+    return list(iter_arxiv(n=n))
@@ -0,0 +1,140 @@
+# dedup.py
+# Near-duplicate segment elimination before scoring and summarization.
+# Each segment gets a MinHash signature over its word shingles; LSH banding puts segments
+# whose signatures agree on a whole band into the same bucket, bucket mates whose estimated
+# Jaccard similarity reaches the threshold are merged with union-find, and each group keeps
+# its first segment in document order. Dedup maps kept segments back to the originals.
+# Segments without any word (punctuation, markup) have no shingles; each gets a signature of
+# its own, so they are never merged with each other or with anything else.
+# redundancy_penalty() is the soft variant for selection: segments similar to a more
+# important one (below the collapse threshold) lose part of their importance.
+
+import re
+import zlib
+
+import numpy as np
+
+PRIME = (1 << 32) + 15  # > any crc32 value
+MAX_BUCKET = 32  # larger buckets are only compared against their first member
+CHUNK = 65536  # shingles per hashing block
+
+
+class Dedup:
+    def __init__(self, segments, keep, mapping, signatures):
+        self.keep = keep  # original ids of the kept segments (ascending)
+        self.mapping = mapping  # original segment -> index into .segments
+        self.segments = [segments[i] for i in self.keep]
+        self.signatures = signatures[self.keep]
+
+    def __len__(self):
+        return len(self.segments)
+
+    @property
+    def removed(self):
+        return len(self.mapping) - len(self.keep)
+
+    def groups(self):
+        """Original segment ids of every kept segment."""
+        order = np.argsort(self.mapping, kind="stable")
+        return np.split(order, np.cumsum(np.bincount(self.mapping, minlength=len(self)))[:-1])
+
+    def expand(self, values):
+        """Per-kept-segment values (e.g. importance) -> one value per original segment."""
+        return np.asarray(values)[self.mapping]
+
+
+def dedup_segments(segments, threshold=0.8, num_perm=64, bands=16, shingle=3, seed=0):
+    """Collapse segments whose estimated Jaccard similarity is >= threshold into a Dedup."""
+    segments = list(segments)
+    signatures = minhash_signatures(segments, num_perm, shingle, seed)
+    parent = np.arange(len(segments))
+    for i, j in _candidate_pairs(signatures, bands):
+        if (signatures[i] == signatures[j]).mean() >= threshold:
+            ri, rj = _find(parent, i), _find(parent, j)
+            parent[max(ri, rj)] = min(ri, rj)  # the root is the earliest segment
+    roots = np.array([_find(parent, i) for i in range(len(segments))], dtype=np.int64)
+    keep, mapping = np.unique(roots, return_inverse=True)
+    return Dedup(segments, keep, mapping.astype(np.int64).reshape(-1), signatures)
+
+
+def redundancy_penalty(signatures, importance_scores, weight=0.5, min_sim=0.5, bands=32):
+    """
+    Importance with a redundancy discount: a segment whose estimated Jaccard similarity to a
+    more important segment is s >= min_sim keeps (1 - weight * s) of its importance.
+    """
+    importance = np.asarray(importance_scores, dtype=np.float64)
+    penalty = np.zeros(len(importance))
+    for i, j in _candidate_pairs(signatures, bands):
+        sim = (signatures[i] == signatures[j]).mean()
+        if sim >= min_sim:
+            low = j if importance[j] < importance[i] or (importance[j] == importance[i] and j > i) else i
+            penalty[low] = max(penalty[low], sim)
+    return importance * (1 - weight * penalty)
+
+
+def shingles(text, k=3):
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return set()
+    if len(words) <= k:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def minhash_signatures(texts, num_perm=64, shingle=3, seed=0):
+    """
+    (n, num_perm) uint64 MinHash signatures over word shingles (crc32, so stable across
+    processes). A text without shingles gets PRIME + its position in every slot, which no
+    real MinHash value (< PRIME) or other text shares.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 31, num_perm, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, num_perm, dtype=np.uint64)
+    hashes = [np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(t, shingle)), dtype=np.uint64)
+              for t in texts]
+    out = np.empty((len(texts), num_perm), dtype=np.uint64)
+    empty = np.array([i for i, h in enumerate(hashes) if not len(h)], dtype=np.uint64)
+    out[empty.astype(np.int64)] = (PRIME + empty)[:, None]
+    rows = [i for i, h in enumerate(hashes) if len(h)]
+    start = 0
+    while start < len(rows):
+        # a block of segments with about CHUNK shingles in total
+        stop, total = start, 0
+        while stop < len(rows) and (total == 0 or total + len(hashes[rows[stop]]) <= CHUNK):
+            total += len(hashes[rows[stop]])
+            stop += 1
+        block = np.concatenate([hashes[i] for i in rows[start:stop]])
+        permuted = (block[:, None] * a + b) % PRIME
+        offsets = np.cumsum([0] + [len(hashes[i]) for i in rows[start:stop - 1]])
+        out[rows[start:stop]] = np.minimum.reduceat(permuted, offsets, axis=0)
+        start = stop
+    return out
+
+
+def _candidate_pairs(signatures, bands):
+    """Pairs (i < j) sharing a bucket in at least one band."""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    pairs = set()
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        _, inverse, counts = np.unique(keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).reshape(-1),
+                                       return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(inverse, kind="stable")
+        for members in np.split(order, np.cumsum(counts)[:-1]):
+            if len(members) < 2:
+                continue
+            members = members.tolist()
+            if len(members) > MAX_BUCKET:
+                pairs.update((members[0], j) for j in members[1:])
+            else:
+                pairs.update((i, j) for x, i in enumerate(members) for j in members[x + 1:])
+    return sorted(pairs)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
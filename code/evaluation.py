@@ -2,15 +2,34 @@
 # Implements metrics (QA: EM/F1, Summarization: ROUGE, BERTScore).
 
 import re
-from sklearn.metrics import f1_score
-from rouge_score import rouge_scorer
-from bert_score import score as bertscore
+import model_registry
+
+ROUGE_TYPES = ['rouge1','rouge2','rougeL']
+
+def _load_rouge():
+    from rouge_score import rouge_scorer
+    return rouge_scorer.RougeScorer(ROUGE_TYPES, use_stemmer=True)
+
+def _load_bertscore():
+    from bert_score import BERTScorer  # imported on use: pulls in torch/transformers
+    return BERTScorer(lang="en")
+
+# One scorer / BERTScore model per process, built on first use
+model_registry.register("rouge", _load_rouge)
+model_registry.register("bertscore", _load_bertscore)
 
 def normalize_answer(s):
     return re.sub(r'\W+', ' ', s).strip().lower()
 
 def qa_metrics(pred, gold):
-    pred, gold = normalize_answer(pred), normalize_answer(gold)
+    return _qa_normalized(normalize_answer(pred), normalize_answer(gold))
+
+def qa_metrics_batch(preds, golds):
+    """[(em, f1)] for aligned preds/golds; each distinct gold is normalized once."""
+    norm_gold = {g: normalize_answer(g) for g in set(golds)}
+    return [_qa_normalized(normalize_answer(p), norm_gold[g]) for p, g in zip(preds, golds)]
+
+def _qa_normalized(pred, gold):
     em = int(pred == gold)
     # F1 = token overlap
     pred_tokens, gold_tokens = pred.split(), gold.split()
@@ -23,7 +42,18 @@ def qa_metrics(pred, gold):
     return em, f1
 
 def summarization_metrics(pred, ref):
-    scorer = rouge_scorer.RougeScorer(['rouge1','rouge2','rougeL'], use_stemmer=True)
-    rouge = scorer.score(ref, pred)
-    P, R, F = bertscore([pred], [ref], lang="en")
-    return rouge, F.mean().item()
+    return summarization_metrics_batch([pred], [ref])[0]
+
+def summarization_metrics_batch(preds, refs, batch_size=64):
+    """
+    [(rouge, bertscore_f1)] for aligned preds/refs, using one shared RougeScorer and
+    one BERTScore model. BERTScore runs as a single batched call, which embeds each
+    distinct sentence once, so a reference scored against several methods is encoded
+    only once per call.
+    """
+    if not preds:
+        return []
+    scorer = model_registry.get("rouge")
+    rouge = [scorer.score(ref, pred) for pred, ref in zip(preds, refs)]
+    P, R, F = model_registry.get("bertscore").score(list(preds), list(refs), batch_size=batch_size)
+    return list(zip(rouge, F.tolist()))
@@ -0,0 +1,223 @@
+# instrument.py
+# Opt-in per-stage instrumentation for pipeline runs.
+# - named spans:   with span("summarize", n=len(segments)): ...
+# - counters:      count("tokens_before", 5123, budget=4000)
+# - per example:   with example(ex_id): ...   (tags every span/counter inside it)
+# - reports:       tracer.summary() -> count / mean / p50 / p95 / p99 / histogram per stage
+# - export:        tracer.export_jsonl(path), tracer.export_chrome_trace(path)
+# Disabled by default (enable() or BPO_TRACE=1); a disabled span is a shared no-op object.
+# With a process pool (parallel.map_examples) workers trace too: each task's records are
+# drained in the worker, returned with its result and merged into the parent's tracer.
+# Timestamps are time.perf_counter(), a system-wide monotonic clock, so they line up.
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        self.tracer._record(self.name, self.start, time.perf_counter(), self.attrs)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes discovered inside the span (e.g. output sizes)."""
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.events = []    # (name, start, end, example, thread id, attrs, pid)
+            self.counters = []  # (name, value, example, attrs, time, pid)
+            self._t0 = time.perf_counter()
+
+    def span(self, name, **attrs):
+        if not self.enabled:
+            return _NULL
+        return _Span(self, name, attrs)
+
+    def example(self, example_id):
+        """Span covering one example; nested spans and counters are tagged with its id."""
+        if not self.enabled:
+            return _NULL
+        return _ExampleSpan(self, example_id)
+
+    def count(self, name, value, **attrs):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters.append((name, value, getattr(self._local, "example", None), attrs,
+                                  time.perf_counter(), os.getpid()))
+
+    def _record(self, name, start, end, attrs):
+        with self._lock:
+            self.events.append((name, start, end, getattr(self._local, "example", None),
+                                threading.get_ident(), attrs, os.getpid()))
+
+    def drain(self):
+        """Take (and clear) the records so far: (events, counters), picklable."""
+        with self._lock:
+            records = (self.events, self.counters)
+            self.events, self.counters = [], []
+        return records
+
+    def merge(self, records):
+        """Add records drained from another tracer (e.g. a pool worker)."""
+        events, counters = records
+        with self._lock:
+            self.events.extend(events)
+            self.counters.extend(counters)
+
+    # ---- reports ----
+
+    def durations(self):
+        """{stage: [seconds, ...]} over all recorded spans."""
+        out = defaultdict(list)
+        for name, start, end, *_ in self.events:
+            out[name].append(end - start)
+        return dict(out)
+
+    def per_example(self):
+        """{example id: {stage: total seconds}}."""
+        out = defaultdict(lambda: defaultdict(float))
+        for name, start, end, ex, *_ in self.events:
+            if ex is not None:
+                out[ex][name] += end - start
+        return {ex: dict(stages) for ex, stages in out.items()}
+
+    def summary(self, bins=10):
+        stages = {}
+        for name, secs in self.durations().items():
+            stages[name] = _distribution(np.asarray(secs), bins)
+        per_ex = self.per_example()
+        example_stats = {}
+        for name in {n for stages_ in per_ex.values() for n in stages_}:
+            example_stats[name] = _distribution(np.asarray([s[name] for s in per_ex.values() if name in s]), bins)
+        counters = defaultdict(list)
+        for name, value, _, attrs, *_ in self.counters:
+            key = name if not attrs else name + "[" + ",".join(f"{k}={v}" for k, v in sorted(attrs.items())) + "]"
+            counters[key].append(value)
+        return {
+            "stages": stages,
+            "per_example": example_stats,
+            "counters": {k: {"count": len(v), "total": float(np.sum(v)), "mean": float(np.mean(v))}
+                         for k, v in counters.items()},
+        }
+
+    def export_jsonl(self, path):
+        with self._lock:
+            events, counters, t0 = list(self.events), list(self.counters), self._t0
+        with open(path, "w", encoding="utf-8") as f:
+            for name, start, end, ex, tid, attrs, pid in events:
+                f.write(json.dumps({"type": "span", "name": name, "start": start - t0, "seconds": end - start,
+                                    "example": ex, "pid": pid, "thread": tid, "attrs": attrs}, default=str) + "\n")
+            for name, value, ex, attrs, ts, pid in counters:
+                f.write(json.dumps({"type": "counter", "name": name, "value": value, "time": ts - t0,
+                                    "example": ex, "pid": pid, "attrs": attrs}, default=str) + "\n")
+
+    def export_chrome_trace(self, path):
+        """Trace Event Format, viewable in chrome://tracing or Perfetto."""
+        with self._lock:
+            events, counters, t0 = list(self.events), list(self.counters), self._t0
+        trace = []
+        for name, start, end, ex, tid, attrs, pid in events:
+            args = dict(attrs, example=ex) if ex is not None else dict(attrs)
+            trace.append({"name": name, "ph": "X", "ts": (start - t0) * 1e6, "dur": (end - start) * 1e6,
+                          "pid": pid, "tid": tid, "args": args})
+        for name, value, ex, attrs, ts, pid in counters:
+            trace.append({"name": name, "ph": "C", "ts": (ts - t0) * 1e6, "pid": pid, "args": {name: value}})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f, default=str)
+
+
+class _ExampleSpan(_Span):
+    __slots__ = ("prev",)
+
+    def __init__(self, tracer, example_id):
+        super().__init__(tracer, "example", {})
+        self.prev = None
+        self.attrs["id"] = example_id
+
+    def __enter__(self):
+        self.prev = getattr(self.tracer._local, "example", None)
+        self.tracer._local.example = self.attrs["id"]
+        return super().__enter__()
+
+    def __exit__(self, *args):
+        super().__exit__(*args)
+        self.tracer._local.example = self.prev
+        return False
+
+
+def _distribution(secs, bins):
+    if len(secs) == 0:
+        return {"count": 0}
+    hi = float(secs.max())
+    lo = max(float(secs.min()), 1e-6)
+    edges = np.geomspace(lo, max(hi, lo * 1.01), bins + 1)
+    hist, _ = np.histogram(np.clip(secs, edges[0], edges[-1]), bins=edges)
+    p50, p95, p99 = np.percentile(secs, [50, 95, 99])
+    return {"count": int(len(secs)), "total": float(secs.sum()), "mean": float(secs.mean()),
+            "p50": float(p50), "p95": float(p95), "p99": float(p99), "max": hi,
+            "histogram": {"edges": edges.tolist(), "counts": hist.tolist()}}
+
+
+tracer = Tracer(enabled=os.environ.get("BPO_TRACE") == "1")
+
+
+def span(name, **attrs):
+    return tracer.span(name, **attrs)
+
+
+def example(example_id):
+    return tracer.example(example_id)
+
+
+def count(name, value, **attrs):
+    tracer.count(name, value, **attrs)
+
+
+def enable():
+    tracer.enabled = True
+
+
+def disable():
+    tracer.enabled = False
@@ -0,0 +1,158 @@
+# lazy_selection.py
+# Importance-gated summarization with a streaming greedy selector.
+# Every rung of a segment keeps importance * cost / full_cost of its value (see
+# selection._ladder_arrays), so all rungs of a segment share one value density,
+# importance / full_cost, which is known before any summary exists. The selector walks
+# segments in that order, takes the full text whenever it fits, and only asks for
+# summaries of segments it reaches once their full text no longer fits - in batches,
+# prefetching the next segments in the same situation. It stops as soon as the remaining
+# capacity is below a lower bound on the cost of everything left, so low-value segments
+# are never summarized. The LP bound (fractional knapsack over full texts) needs no
+# summaries either, so the gap to it is reported as for the other solvers.
+
+import numpy as np
+
+from scoring import LADDER, extract_keywords, summarize_segments, summary_cache
+from selection import lp_bounds, _gap
+from utils import count_tokens_batch
+
+
+class LazyLadder:
+    """Compression rungs of each segment, produced on demand and memoized.
+    Extractive rungs are computed up front (no model call); summarizer rungs on request."""
+
+    def __init__(self, segments, ladder=LADDER, batch_size=8, cache=summary_cache, summarize=None):
+        self.segments = list(segments)
+        self.ladder = tuple(ladder)
+        self.rungs = tuple(name for name, _ in self.ladder) + ("full",)
+        self.batch_size = batch_size
+        self.prefetch = batch_size or 1  # segments summarized per request (None: one at a time)
+        self.cache = cache
+        self.summarize = summarize
+        self.summarized = 0  # segments sent to summarize_segments (per summarizer rung)
+        n, k = len(self.segments), len(self.rungs)
+        self.texts = [[None] * n for _ in range(k - 1)] + [self.segments]
+        self.costs = np.full((n, k), -1, dtype=np.int64)  # -1: not produced yet
+        self.costs[:, -1] = count_tokens_batch(self.segments)
+        for r, (_, lengths) in enumerate(self.ladder):
+            if lengths is None:
+                self.texts[r] = [extract_keywords(seg) for seg in self.segments]
+                self.costs[:, r] = count_tokens_batch(self.texts[r])
+
+    def __len__(self):
+        return len(self.segments)
+
+    def is_ready(self, i):
+        return bool((self.costs[i] >= 0).all())
+
+    def lower_bounds(self):
+        """Per segment, a lower bound on its cheapest useful rung (unknown rungs cost >= 1
+        token; empty rungs carry no value). Bounds only grow as rungs are produced."""
+        return np.maximum(np.where(self.costs >= 0, self.costs, 1), 1).min(axis=1)
+
+    def materialize(self, ids, rung=None):
+        """Produce the missing rungs (or just `rung`) of segments `ids`, one summarizer batch per rung."""
+        for r, (_, lengths) in enumerate(self.ladder):
+            if lengths is None or rung not in (None, r):
+                continue
+            todo = [i for i in ids if self.costs[i, r] < 0]
+            if not todo:
+                continue
+            texts = summarize_segments([self.segments[i] for i in todo], max_len=lengths[0], min_len=lengths[1],
+                                       cache=self.cache, batch_size=self.batch_size, summarize=self.summarize)
+            for i, text, cost in zip(todo, texts, count_tokens_batch(texts)):
+                self.texts[r][i] = text
+                self.costs[i, r] = cost
+            self.summarized += len(todo)
+
+    def text(self, rung, i):
+        if self.texts[rung][i] is None:
+            self.materialize([i], rung)
+        return self.texts[rung][i]
+
+    def gather(self, ids, modes, sep=" "):
+        return sep.join(self.text(int(m), int(i)) for i, m in zip(ids, modes))
+
+    def fill_in_order(self, rung, B):
+        """all_summaries for one rung (document order, skip what does not fit), producing
+        texts only for segments that could still fit the remaining budget."""
+        r = self.rungs.index(rung)
+        chosen, total = [], 0
+        for i in range(len(self)):
+            remaining = B - total
+            if self.costs[i, r] < 0:
+                if remaining < 1:
+                    break
+                # prefetch the next unproduced segments with this one
+                todo = [j for j in range(i, len(self)) if self.costs[j, r] < 0][:self.prefetch]
+                self.materialize(todo, r)
+            if self.costs[i, r] <= remaining:
+                chosen.append(self.texts[r][i])
+                total += int(self.costs[i, r])
+        return " ".join(chosen), total
+
+
+def lazy_select(ladder, importance_scores, budgets, return_info=False):
+    """
+    Streaming greedy over a LazyLadder at several budgets (ascending; summaries produced
+    for one budget are reused by the next): {B: (ids, modes, cost, value[, info])} with
+    ids in value-density order and modes indexing ladder.rungs, like select_table_multi.
+    """
+    importance = np.asarray(importance_scores, dtype=np.float64)
+    full = ladder.costs[:, -1]
+    density = importance / np.maximum(full, 1)
+    order = np.argsort(-density, kind="stable")
+    order = order[importance[order] > 0]  # zero-value segments never enter
+
+    results = {}
+    budgets = sorted(set(int(B) for B in budgets))
+    bounds = lp_bounds(importance[:, None], full[:, None], budgets) if return_info else {}
+    for B in budgets:
+        ids, modes, cost, value = _stream(ladder, importance, order, B)
+        if return_info:
+            info = {"method": "lazy", "bound": bounds[B], "gap": _gap(value, bounds[B])}
+            results[B] = (ids, modes, cost, value, info)
+        else:
+            results[B] = (ids, modes, cost, value)
+    return results
+
+
+def _stream(ladder, importance, order, B):
+    full_col = len(ladder.rungs) - 1
+    ids, modes = [], []
+    remaining, value = B, 0.0
+    lb, rest_lb = _bounds(ladder, order)
+    for pos, i in enumerate(order.tolist()):
+        full = int(ladder.costs[i, full_col])
+        if full <= remaining:
+            ids.append(i)
+            modes.append(full_col)
+            remaining -= full
+            value += importance[i]
+            continue
+        if remaining < rest_lb[pos]:
+            break  # nothing left can fit
+        if lb[i] > remaining:
+            continue
+        if not ladder.is_ready(i):
+            # these will not fit in full either; summarize them together with i
+            later = [j for j in order[pos + 1:].tolist()
+                     if ladder.costs[j, full_col] > remaining and lb[j] <= remaining and not ladder.is_ready(j)]
+            ladder.materialize([i] + later[:ladder.prefetch - 1])
+            lb, rest_lb = _bounds(ladder, order)
+        costs = ladder.costs[i, :full_col]
+        fits = np.flatnonzero((costs <= remaining) & (costs > 0))
+        if len(fits):
+            r = int(fits[np.argmax(costs[fits])])  # same density: the longest rung is worth most
+            ids.append(i)
+            modes.append(r)
+            remaining -= int(costs[r])
+            value += importance[i] * (costs[r] / max(full, 1))
+    return np.asarray(ids, dtype=np.int64), np.asarray(modes, dtype=np.int64), B - remaining, float(value)
+
+
+def _bounds(ladder, order):
+    """Per-segment cost lower bounds and their suffix minima along `order`."""
+    lb = ladder.lower_bounds()
+    rest_lb = np.minimum.accumulate(lb[order][::-1])[::-1] if len(order) else lb[order]
+    return lb, rest_lb
@@ -5,32 +5,51 @@ from utils import load_text, count_tokens
 from segmentation import segment_text
 from scoring import compute_importance, summarize_segments
 from selection import budgeted_selection
+from instrument import tracer, span, count
+from assembly import order_selection
 
 # Step 1: Load input text
-raw_text = load_text("sample_long_text.txt")
+with span("load_text"):
+    raw_text = load_text("sample_long_text.txt")
 
 # Step 2: Segment text
-segments = segment_text(raw_text)
+with span("segment"):
+    segments = segment_text(raw_text)
 
 # Step 3: Define query (for QA; for summarization use generic)
 query = "What is the contribution of this paper?"
 
 # Step 4: Importance scoring + summarization
-importance_scores = compute_importance(segments, query)
-summaries = summarize_segments(segments)
+with span("importance"):
+    importance_scores = compute_importance(segments, query)
+with span("summarize", n=len(segments)):
+    summaries = summarize_segments(segments)
 
 # Step 5: Run budgeted prefill optimization
 budget = 400  # set token budget
-selected, cost, val = budgeted_selection(segments, summaries, importance_scores, budget)
+with span("selection"):
+    selected, cost, val = budgeted_selection(segments, summaries, importance_scores, budget)
+count("tokens_before", count_tokens(raw_text))
+count("tokens_after", cost, budget=budget)
 
 # Step 6: Build final prompt
+# "selection" keeps value-density order; "document" / "core" give prefix-cache friendly
+# prompts across queries on the same document (see assembly.py)
+prompt_order = "document"
+ids, modes = order_selection([sel["id"] for sel in selected], [sel["mode"] for sel in selected], prompt_order)
 final_prompt = []
-for sel in selected:
-    if sel["mode"] == "summary":
-        final_prompt.append(summaries[sel["id"]])
+for i, mode in zip(ids, modes):
+    if mode == "summary":
+        final_prompt.append(summaries[i])
     else:
-        final_prompt.append(segments[sel["id"]])
+        final_prompt.append(segments[i])
 
 final_prompt_text = "\n".join(final_prompt)
 print("Final prompt length:", count_tokens(final_prompt_text))
 print("\n==== Final Prompt ====\n", final_prompt_text[:1000], "...")
+
+# Stage timings (only when tracing is enabled, e.g. BPO_TRACE=1)
+if tracer.enabled:
+    for stage, st in tracer.summary()["stages"].items():
+        print(f"{stage:12s} {st['total']:.4f}s")
+    tracer.export_chrome_trace("trace.json")
@@ -0,0 +1,98 @@
+# model_registry.py
+# Lazily initialized, thread-safe model handles.
+# Modules register a factory per model name; the model is built on first use and
+# shared afterwards. Callers (tests, benchmarks, services) can inject stand-ins
+# with override() before anything touches the real model.
+
+import threading
+
+_factories = {}
+_instances = {}
+_overridden = set()
+_lock = threading.RLock()
+
+
+def register(name, factory):
+    """Register (or replace) the zero-argument factory that builds model `name`."""
+    with _lock:
+        _factories[name] = factory
+
+
+def override(name, obj):
+    """Use `obj` for `name` instead of calling its factory."""
+    with _lock:
+        _instances[name] = obj
+        _overridden.add(name)
+
+
+def reset(name=None):
+    """Forget loaded/overridden instances (all of them when name is None)."""
+    with _lock:
+        if name is None:
+            _instances.clear()
+            _overridden.clear()
+        else:
+            _instances.pop(name, None)
+            _overridden.discard(name)
+
+
+def snapshot():
+    """Current instances and overrides, for restore()."""
+    with _lock:
+        return dict(_instances), set(_overridden)
+
+
+def restore(state):
+    """Return to a snapshot() (e.g. after temporarily installing stand-ins)."""
+    instances, overridden = state
+    with _lock:
+        _instances.clear()
+        _instances.update(instances)
+        _overridden.clear()
+        _overridden.update(overridden)
+
+
+def is_loaded(name):
+    return name in _instances
+
+
+def fingerprint(name, default):
+    """Identifier for cache keys: `default` (the real model id) unless a stand-in is
+    installed, so stand-in outputs never share cache entries with the real model."""
+    if name not in _overridden:
+        return default
+    obj = _instances.get(name)
+    label = getattr(obj, "name", None)
+    if label is None:
+        ref = obj if hasattr(obj, "__qualname__") else type(obj)
+        label = f"{ref.__module__}.{ref.__qualname__}"
+    return f"override:{label}"
+
+
+def get(name):
+    obj = _instances.get(name)
+    if obj is not None or name in _instances:
+        return obj
+    with _lock:  # double-checked: only one thread runs the factory
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"No model registered under {name!r}")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+class LazyModel:
+    """Proxy for a registry entry; resolves it on first attribute access or call."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(get(self._name), attr)
+
+    def __call__(self, *args, **kwargs):
+        return get(self._name)(*args, **kwargs)
+
+    def __repr__(self):
+        state = "loaded" if is_loaded(self._name) else "not loaded"
+        return f"LazyModel({self._name!r}, {state})"
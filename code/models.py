@@ -1,10 +1,12 @@
 # 5. models.py
 # Wraps HuggingFace LLaMA-2 or GPT-3.5 (if API available).
 
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
+import contextlib
+
+# torch / transformers are imported inside the functions so importing this module stays cheap
 
 def load_model(model_name="meta-llama/Llama-2-7b-chat-hf"):
+    from transformers import AutoModelForCausalLM, AutoTokenizer
     tokenizer = AutoTokenizer.from_pretrained(model_name)
     model = AutoModelForCausalLM.from_pretrained(model_name, device_map="auto")
     return model, tokenizer
@@ -13,3 +15,37 @@ def run_llm(model, tokenizer, prompt, max_new_tokens=128):
     input_ids = tokenizer(prompt, return_tensors="pt").to(model.device)
     output = model.generate(**input_ids, max_new_tokens=max_new_tokens)
     return tokenizer.decode(output[0], skip_special_tokens=True)
+
+def run_llm_batch(model, tokenizer, prompts, max_new_tokens=128, batch_size=8):
+    """
+    Generate for many prompts; returns decoded outputs in input order (same format as run_llm).
+    Prompts are sorted by token length and cut into buckets of batch_size, each
+    left-padded and run in a single generate call.
+    """
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    lengths = [len(ids) for ids in tokenizer(list(prompts))["input_ids"]]
+    order = sorted(range(len(prompts)), key=lambda i: lengths[i])
+    outputs = [None] * len(prompts)
+
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = "left"  # decoder-only: new tokens must follow the prompt directly
+    try:
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            enc = tokenizer([prompts[i] for i in bucket], return_tensors="pt", padding=True).to(model.device)
+            with _no_grad():
+                out = model.generate(**enc, max_new_tokens=max_new_tokens, pad_token_id=tokenizer.pad_token_id)
+            for i, seq in zip(bucket, out):
+                outputs[i] = tokenizer.decode(seq, skip_special_tokens=True)
+    finally:
+        tokenizer.padding_side = padding_side
+    return outputs
+
+def _no_grad():
+    try:
+        import torch
+    except ImportError:  # a model that does not run on torch
+        return contextlib.nullcontext()
+    return torch.no_grad()
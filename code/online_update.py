@@ -1,19 +1,116 @@
 # 7. online_update.py
 # Implements a toy online learning (bandit-style adjustment).
+# Weights cover FEATURES; score() / update() take whole arrays (or scalars), update_batch()
+# applies one averaged step for a mini-batch of feedback. The default weights reproduce
+# the fixed 0.5 * BM25 + 0.5 * cosine fusion, so compute_importance(..., scorer=...)
+# only changes ranking once feedback has moved them.
+# State persists as JSON (atomic replace); update_file() serializes concurrent workers
+# with an exclusive file lock so no update is lost.
+
+import json
+import os
+import threading
 
 import numpy as np
 
+try:
+    import fcntl
+except ImportError:  # non-POSIX: update_file falls back to an unlocked read-modify-write
+    fcntl = None
+
+FEATURES = ("bm25", "emb", "position", "length", "compression")
+STATE_VERSION = 1
+
+
 class OnlineScorer:
-    def __init__(self, alpha=0.1):
-        self.weights = np.array([0.5, 0.5])  # BM25, Embedding
+    def __init__(self, alpha=0.1, weights=None):
+        self.weights = np.array([0.5, 0.5, 0.0, 0.0, 0.0]) if weights is None else np.asarray(weights, dtype=np.float64)
         self.alpha = alpha
+        self.n_updates = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def features(bm25_score, emb_score, position=None, length=None, compression=None):
+        """(n, len(FEATURES)) matrix; missing features are 0.
+        position: relative position in the document (0 = first segment), length: segment
+        length relative to the longest, compression: summary cost / full cost."""
+        bm25 = np.atleast_1d(np.asarray(bm25_score, dtype=np.float64))
+        X = np.zeros((len(bm25), len(FEATURES)))
+        X[:, 0] = bm25
+        X[:, 1] = emb_score
+        for j, col in ((2, position), (3, length), (4, compression)):
+            if col is not None:
+                X[:, j] = col
+        return X
+
+    def score(self, bm25_score, emb_score, **features):
+        """Weighted score; scalars give a scalar, arrays give one score per segment."""
+        scores = self.score_features(self.features(bm25_score, emb_score, **features))
+        return scores if np.ndim(bm25_score) else float(scores[0])
+
+    def score_features(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.weights
+
+    def update(self, bm25_score, emb_score, success, **features):
+        """One feedback step; arrays are treated as a mini-batch (see update_batch)."""
+        X = self.features(bm25_score, emb_score, **features)
+        self.update_batch(X, np.broadcast_to(success, len(X)))
+
+    def update_batch(self, X, success):
+        """Averaged step over rows of X with success flags (True/False, or rewards in [-1, 1])."""
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(FEATURES))
+        success = np.asarray(success)
+        if success.dtype.kind in "biu":  # flags: success -> +1, failure -> -1 (as update())
+            sign = np.where(success, 1.0, -1.0)
+        else:
+            sign = success.astype(np.float64)
+        if not len(X):
+            return
+        grad = (X * sign[:, None]).mean(axis=0)
+        with self._lock:
+            w = np.clip(self.weights + self.alpha * grad, 0, 1)
+            if w.sum() > 0:
+                w /= w.sum()
+            self.weights = w
+            self.n_updates += len(X)
+
+    # ---- persistence ----
+
+    def state(self):
+        with self._lock:
+            return {"version": STATE_VERSION, "features": list(FEATURES), "weights": self.weights.tolist(),
+                    "alpha": self.alpha, "n_updates": self.n_updates}
+
+    def save(self, path):
+        """Atomic write: readers see either the old or the new state."""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state(), f)
+        os.replace(tmp, path)
 
-    def score(self, bm25_score, emb_score):
-        return np.dot(self.weights, np.array([bm25_score, emb_score]))
+    @classmethod
+    def load(cls, path, alpha=None):
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        # weights are stored by feature name, so states saved with fewer features still load
+        named = dict(zip(state["features"], state["weights"]))
+        scorer = cls(alpha=state["alpha"] if alpha is None else alpha,
+                     weights=[named.get(name, 0.0) for name in FEATURES])
+        scorer.n_updates = state.get("n_updates", 0)
+        return scorer
 
-    def update(self, bm25_score, emb_score, success):
-        grad = np.array([bm25_score, emb_score]) * (1 if success else -1)
-        self.weights += self.alpha * grad
-        self.weights = np.clip(self.weights, 0, 1)
-        if self.weights.sum() > 0:
-            self.weights /= self.weights.sum()
+    @classmethod
+    def update_file(cls, path, X, success, alpha=0.1):
+        """Load the latest state at `path`, apply update_batch, save - under an exclusive
+        lock, so concurrent workers' updates are applied one after another."""
+        with open(path + ".lock", "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                scorer = cls.load(path) if os.path.exists(path) else cls(alpha=alpha)
+                scorer.update_batch(X, success)
+                scorer.save(path)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+        return scorer
@@ -0,0 +1,56 @@
+# parallel.py
+# Process-pool runner for per-example experiment work.
+# Workers are started once (spawn) and keep whatever models their modules load,
+# so embedder/summarizer/LLM are loaded per worker, not per task. Results are
+# yielded in example order, so aggregation is identical to a serial run.
+# When tracing is enabled, workers trace as well and each task's spans/counters are
+# merged into the parent's tracer as its result arrives.
+
+import multiprocessing as mp
+import os
+from functools import partial
+
+from instrument import tracer
+
+
+def _init_worker(initializer, threads, trace=False):
+    tracer.enabled = trace
+    try:
+        import torch
+        torch.set_num_threads(threads)  # avoid oversubscribing cores across workers
+    except ImportError:
+        pass
+    if initializer is not None:
+        initializer()
+
+
+def map_examples(fn, examples, workers=1, initializer=None, chunksize=1):
+    """
+    Yield fn(ex) for every example, in order.
+    fn / initializer must be picklable (module-level functions or functools.partial).
+    workers <= 1 runs in the current process.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer()
+        for ex in examples:
+            yield fn(ex)
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    trace = tracer.enabled
+    task = partial(_traced, fn) if trace else fn
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(initializer, threads, trace)) as pool:
+        for res in pool.imap(task, examples, chunksize=chunksize):
+            if trace:
+                res, records = res
+                tracer.merge(records)
+            yield res
+
+
+def _traced(fn, ex):
+    """Worker side: the result plus the records since the previous task (the first task
+    also carries the initializer's, e.g. model loading)."""
+    res = fn(ex)
+    return res, tracer.drain()
@@ -0,0 +1,244 @@
+# preprocess.py
+# Offline, query-independent document preprocessing.
+# Segmentation, segment embeddings, BM25 statistics, summaries and token costs do not
+# depend on the query, so they are computed once per document and stored as an artifact:
+#
+#   <root>/<doc_id>/
+#       manifest.json    format version, document hash, model fingerprints, segmenter and
+#                        compression ladder, sizes
+#       index/           SegmentIndex arrays (BM25 CSR + embeddings), see segment_index.py
+#       text.npy         UTF-8 buffer of every compression rung's texts (SegmentTable)
+#       offsets.npy      (rungs, n + 1) byte offsets into text.npy
+#       costs.npy        (rungs, n) token costs
+#
+# Every array is a plain .npy file, opened memory-mapped on load. Online work per query
+# is then one query embedding, vectorized BM25 and the selection:
+#
+#   art = DocumentArtifact.load(path)
+#   importance = compute_importance(art, query)           # or art.importance(query)
+#   ids, modes, cost, value = art.select(query, B)        # prompt: art.table.gather(ids, modes)
+
+import json
+import os
+import shutil
+import threading
+import time
+from functools import partial
+
+import numpy as np
+
+import model_registry
+from scoring import (EMBEDDER_MODEL, LADDER, SUMMARIZER_MODEL, bm25_tokenizer, compute_importance, embedder,
+                     summarize_ladder, summarize_segments)
+from segment_index import SegmentIndex
+from segment_table import SegmentTable
+from segmentation import segment_text
+from selection import select_table
+from utils import content_hash, get_token_counter
+
+FORMAT_VERSION = 2  # 2: k-rung compression ladder (offsets/costs per rung)
+
+
+def model_fingerprints():
+    """Identifiers of every model an artifact depends on (stand-ins included)."""
+    return {
+        "embedder": model_registry.fingerprint("embedder", EMBEDDER_MODEL),
+        "word_tokenizer": model_registry.fingerprint("word_tokenizer", "nltk.word_tokenize"),
+        "summarizer": model_registry.fingerprint("summarizer", SUMMARIZER_MODEL),
+        "token_counter": get_token_counter().name,
+    }
+
+
+class DocumentArtifact:
+    def __init__(self, manifest, index, table):
+        self.manifest = manifest
+        self.index = index
+        self.table = table
+
+    @property
+    def doc_id(self):
+        return self.manifest["doc_id"]
+
+    def __len__(self):
+        return len(self.table)
+
+    def __iter__(self):
+        return iter(self.table)
+
+    def importance(self, query, encode=None):
+        """Query importance per segment; also stored in table.importance."""
+        scores = compute_importance(self, query, encode=encode)
+        self.table.importance = np.asarray(scores, dtype=np.float64)
+        return self.table.importance
+
+    def select(self, query, B, method="fptas", eps=0.05, return_info=False):
+        """importance + select_table: (ids, modes, cost, value[, info])."""
+        self.importance(query)
+        return select_table(self.table, B, method=method, eps=eps, return_info=return_info)
+
+    def save(self, path):
+        """Write the artifact directory (atomic swap of a temporary directory)."""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        self.index.save(os.path.join(tmp, "index"))
+        np.save(os.path.join(tmp, "text.npy"), np.frombuffer(self.table.buffer, dtype=np.uint8))
+        np.save(os.path.join(tmp, "offsets.npy"), self.table.offsets)
+        np.save(os.path.join(tmp, "costs.npy"), self.table.rung_costs)
+        with open(os.path.join(tmp, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        # replacing an artifact: move the old one aside first so `path` is missing only
+        # between two renames, and restore it if the swap fails
+        old = None
+        if os.path.isdir(path):
+            old = f"{tmp[:-len('.tmp')]}.old"
+            shutil.rmtree(old, ignore_errors=True)
+            os.replace(path, old)
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            if old is not None:
+                os.replace(old, path)
+            raise
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+        self.index.path = os.path.join(path, "index")
+
+    @classmethod
+    def load(cls, path, mmap_mode="r", check=True):
+        """
+        Open an artifact (arrays memory-mapped). With check=True a format version or
+        model fingerprint that differs from the current setup raises ValueError, since
+        stored embeddings/costs would not match the query-time models.
+        """
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if check:
+            problem = stale_reason(manifest)
+            if problem:
+                raise ValueError(f"Artifact {path} is stale: {problem}")
+        index = SegmentIndex.load(os.path.join(path, "index"), mmap_mode=mmap_mode)
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode)
+                  for name in ("text", "offsets", "costs")}
+        table = SegmentTable(arrays["text"], arrays["offsets"], arrays["costs"], rungs=manifest["rungs"])
+        return cls(manifest, index, table)
+
+
+def build_settings(segmenter="punkt", ladder=LADDER):
+    """Preprocessing settings recorded in the manifest, in their JSON form."""
+    return {"segmenter": segmenter, "ladder": json.loads(json.dumps(ladder or None))}
+
+
+def stale_reason(manifest, fingerprints=None, settings=None):
+    """
+    Why `manifest` does not match the current models (None if it does); with `settings`
+    (see build_settings) a different segmenter or compression ladder is stale as well.
+    """
+    if manifest.get("format_version") != FORMAT_VERSION:
+        return f"format version {manifest.get('format_version')} != {FORMAT_VERSION}"
+    for name, value in (settings or {}).items():
+        if manifest.get(name) != value:
+            return f"{name} is {manifest.get(name)!r}, expected {value!r}"
+    fingerprints = fingerprints or model_fingerprints()
+    for name, fp in fingerprints.items():
+        if manifest.get("models", {}).get(name) != fp:
+            return f"{name} is {manifest.get('models', {}).get(name)!r}, expected {fp!r}"
+    return None
+
+
+def preprocess_document(document, doc_id=None, segmenter="punkt", summary_batch_size=8, ladder=LADDER):
+    """Run every query-independent stage on one document (ladder=None: summary + full only)."""
+    segments = segment_text(document, backend=segmenter)
+    index = SegmentIndex.build(segments, embedder.encode, bm25_tokenizer)
+    if ladder:
+        table = SegmentTable.from_rungs(summarize_ladder(segments, ladder, batch_size=summary_batch_size) + [segments],
+                                        [name for name, _ in ladder] + ["full"])
+    else:
+        table = SegmentTable.from_lists(segments, summarize_segments(segments, batch_size=summary_batch_size))
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "doc_id": doc_id or content_hash(document)[:16],
+        "content_hash": content_hash(document),
+        **build_settings(segmenter, ladder),
+        "rungs": list(table.rungs),
+        "models": model_fingerprints(),
+        "n_segments": len(segments),
+        "n_bytes": len(table.buffer),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    return DocumentArtifact(manifest, index, table)
+
+
+class ArtifactStore:
+    """Directory of per-document artifacts: <root>/<doc_id>/."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, doc_id):
+        return os.path.join(self.root, str(doc_id).replace("/", "__"))
+
+    def __contains__(self, doc_id):
+        return os.path.isfile(os.path.join(self.path(doc_id), "manifest.json"))
+
+    def get(self, doc_id, mmap_mode="r", check=True):
+        return DocumentArtifact.load(self.path(doc_id), mmap_mode=mmap_mode, check=check)
+
+    def put(self, artifact):
+        os.makedirs(self.root, exist_ok=True)
+        artifact.save(self.path(artifact.doc_id))
+
+    def is_current(self, doc_id, document=None, settings=None):
+        """
+        Artifact exists, matches the current models and (if given) the document text and
+        preprocessing settings (build_settings(segmenter, ladder)).
+        """
+        try:
+            with open(os.path.join(self.path(doc_id), "manifest.json"), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if document is not None and manifest.get("content_hash") != content_hash(document):
+            return False
+        return stale_reason(manifest, settings=settings) is None
+
+
+def _preprocess_one(item, root, segmenter, summary_batch_size, ladder, overwrite):
+    doc_id, document = item
+    store = ArtifactStore(root)
+    if not overwrite and store.is_current(doc_id, document, build_settings(segmenter, ladder)):
+        return doc_id, False
+    store.put(preprocess_document(document, doc_id, segmenter, summary_batch_size, ladder))
+    return doc_id, True
+
+
+def preprocess_corpus(documents, root, segmenter="punkt", summary_batch_size=8, ladder=LADDER,
+                      overwrite=False, workers=1, initializer=None):
+    """
+    Build artifacts for an iterable of (doc_id, text); up-to-date artifacts are skipped.
+    Returns {doc_id: built (True) or reused (False)}.
+    """
+    from parallel import map_examples
+    fn = partial(_preprocess_one, root=root, segmenter=segmenter,
+                 summary_batch_size=summary_batch_size, ladder=ladder, overwrite=overwrite)
+    return dict(map_examples(fn, documents, workers=workers, initializer=initializer))
+
+
+if __name__ == "__main__":
+    import argparse
+    from data_loaders import iter_govreport
+
+    parser = argparse.ArgumentParser(description="Preprocess GovReport documents into artifacts")
+    parser.add_argument("root")
+    parser.add_argument("-n", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--stubs", action="store_true", help="use local stand-in models (stubs.py)")
+    args = parser.parse_args()
+    initializer = None
+    if args.stubs:
+        from stubs import install_stubs
+        install_stubs()
+        initializer = install_stubs  # spawned workers need the stand-ins too
+    docs = ((ex["id"], ex["report"]) for ex in iter_govreport(n=args.n))
+    built = preprocess_corpus(docs, args.root, workers=args.workers, initializer=initializer)
+    print(f"[INFO] {sum(built.values())} artifacts built, {len(built) - sum(built.values())} up to date")
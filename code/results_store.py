@@ -0,0 +1,88 @@
+# results_store.py
+# Append-only store of per-example experiment results (SQLite).
+# One row per (dataset, example_id, method, budget, config) with the metrics as JSON; config
+# is config_hash() of everything that changes results (models, solver, ladder, flags), so
+# runs with different settings never mix. Rows are never updated: a rerun asks missing()
+# which (method, budget) keys an example still lacks and only computes those, and
+# aggregation reads the stored rows back. path=":memory:" keeps a run-local store.
+
+import json
+import sqlite3
+import time
+
+from utils import content_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    dataset TEXT NOT NULL,
+    example_id TEXT NOT NULL,
+    method TEXT NOT NULL,
+    budget INTEGER NOT NULL,
+    config TEXT NOT NULL,
+    metrics TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (dataset, example_id, method, budget, config)
+);
+CREATE TABLE IF NOT EXISTS configs (
+    config TEXT PRIMARY KEY,
+    params TEXT NOT NULL
+);
+"""
+
+
+def config_hash(params):
+    """Short stable id of a JSON-serializable settings dict."""
+    return content_hash(json.dumps(params, sort_keys=True, default=str))[:16]
+
+
+class ResultStore:
+    def __init__(self, path=":memory:"):
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def register_config(self, params):
+        """Record the settings behind a config hash and return the hash."""
+        config = config_hash(params)
+        with self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO configs VALUES (?, ?)",
+                               (config, json.dumps(params, sort_keys=True, default=str)))
+        return config
+
+    def put(self, dataset, config, example_id, rows):
+        """Append one example's results, rows = {budget: {method: metrics}}, in one transaction.
+        Keys that are already stored keep their first result."""
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(dataset, str(example_id), method, int(B), config, json.dumps(metrics), now)
+                 for B, by_method in rows.items() for method, metrics in by_method.items()])
+
+    def missing(self, dataset, config, example_id, methods, budgets):
+        """Budgets at which some of `methods` has no stored result for this example."""
+        stored = set(self._conn.execute(
+            "SELECT method, budget FROM results WHERE dataset = ? AND config = ? AND example_id = ?",
+            (dataset, config, str(example_id))))
+        return [B for B in budgets if any((m, int(B)) not in stored for m in methods)]
+
+    def load(self, dataset, config, example_ids, methods, budgets):
+        """{B: {method: [metrics, ...]}} over example_ids (in that order), like the in-memory runs."""
+        order = {str(ex): i for i, ex in enumerate(example_ids)}
+        results = {B: {m: [] for m in methods} for B in budgets}
+        rows = self._conn.execute(
+            "SELECT example_id, method, budget, metrics FROM results WHERE dataset = ? AND config = ?",
+            (dataset, config))
+        selected = sorted((order[ex], method, B, metrics) for ex, method, B, metrics in rows
+                          if ex in order and B in results and method in results[B])
+        for _, method, B, metrics in selected:
+            results[B][method].append(json.loads(metrics))
+        return results
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
@@ -25,30 +25,118 @@ Covers QA (HotpotQA) and Summarization (GovReport/ArXiv).
 Generates metrics for baselines + BPO and reports LaTeX-ready tables.
 """
 
-import random
-from utils import count_tokens, Timer
-from data_loaders import load_hotpotqa, load_govreport
+import os
+from functools import partial
+
+import numpy as np
+from utils import TokenCounter, content_hash, set_token_counter
+from instrument import tracer, span, example, count
+from data_loaders import iter_hotpotqa, iter_govreport
 from segmentation import segment_text
-from scoring import compute_importance, summarize_segments
-from selection import budgeted_selection
+from dedup import dedup_segments, minhash_signatures, redundancy_penalty
+from scoring import LADDER, compute_importance, summarize_ladder, summarize_segments
+from online_update import OnlineScorer
+from selection import select_table_multi
+from budget_controller import choose_budgets
+from assembly import CoreTracker, order_selection
+from segment_table import SegmentTable
+from lazy_selection import LazyLadder, lazy_select
 from baselines import full_context, truncation, retrieval_topk, all_summaries, oracle_selection
-from evaluation import qa_metrics, summarization_metrics
+from evaluation import qa_metrics_batch, summarization_metrics_batch
 from ablations import run_with_budgets
+from parallel import map_examples
 from report import make_qa_table, make_sum_table, make_ablation_table, save_latex_table
+from results_store import ResultStore
+from preprocess import model_fingerprints
+
+# Segments per summarizer call (batched summarization; None = one call per segment)
+SUMMARY_BATCH_SIZE = 8
+# Knapsack solver behind the BPO method (see selection.budgeted_selection)
+BPO_METHOD = "fptas"
+# Compression rungs BPO chooses from besides the full text (scoring.LADDER; must include
+# "summary", which the summary baseline uses). None = summary or full only.
+COMPRESSION_LADDER = LADDER
+# Importance-gated summarization (lazy_selection.py): BPO becomes the streaming greedy and
+# summaries are only produced for segments that can still enter the selection
+LAZY_SUMMARIES = False
+# Adaptive per-query budget (budget_controller.py): the QA experiment adds a "BPO-adaptive"
+# method that picks its own budget between this floor and each run budget (its ceiling).
+# None = off.
+ADAPTIVE_FLOOR = None
+# Near-duplicate segments (dedup.py) are collapsed before scoring and summarization;
+# REDUNDANCY_PENALTY > 0 also discounts segments similar to a more important one.
+DEDUP = False
+DEDUP_THRESHOLD = 0.8
+REDUNDANCY_PENALTY = 0.0
+# Order of the selected segments in BPO prompts (assembly.ORDERS); "document" keeps prompts
+# of the same document prefix-cache friendly across queries, "core" also pins the segments
+# most selections on the document share (all budgets of an example, in ascending order)
+PROMPT_ORDER = "selection"
+# Prompts per generate call in the QA experiment
+LLM_BATCH_SIZE = 6
+
+# Learned importance weights (online_update.OnlineScorer state file): QA examples are scored
+# with them and feed back which segments held the answer. Unset = fixed 0.5/0.5 fusion.
+SCORER_PATH = os.environ.get("BPO_SCORER")
+
+# Example-level worker processes (each loads its own models once)
+WORKERS = int(os.environ.get("BPO_WORKERS", "1"))
+
+# Per-example results store (results_store.py) used by __main__: reruns only compute the
+# (example, method, budget) results it does not hold yet
+RESULTS_DB = os.environ.get("BPO_RESULTS", "results.sqlite")
+# Summarization examples whose metrics are computed (and stored) together
+SUM_METRICS_CHUNK = 16
+SUM_METHODS = ["trunc", "summary", "BPO"]
+
+# Module settings the per-example work reads. Pool workers are spawned and would re-read
+# the defaults above, so they get the parent's current values (see _init_worker).
+SETTINGS = ("LLM_NAME", "SUMMARY_BATCH_SIZE", "BPO_METHOD", "COMPRESSION_LADDER", "LAZY_SUMMARIES",
+            "ADAPTIVE_FLOOR", "DEDUP", "DEDUP_THRESHOLD", "REDUNDANCY_PENALTY", "PROMPT_ORDER",
+            "LLM_BATCH_SIZE", "SCORER_PATH")
+
+QA_METHODS = ["full", "trunc", "retrieval", "summary", "BPO", "oracle"]
+ADAPTIVE_METHOD = "BPO-adaptive"
+PROMPT_TEMPLATE = "Context:\n{}\n\nQuestion: {}\nAnswer:"
 
 # ----------------------------
 # QA Experiment (HotpotQA)
 # ----------------------------
 
-from models import load_model, run_llm
+from models import load_model, run_llm_batch
+import model_registry
+
+LLM_NAME = "facebook/opt-350m"  # lightweight open model (replace with bigger if GPU allows)
+
+def _load_llm():
+    """Load the LLM on first use; (None, None) means fall back to heuristic predictions."""
+    try:
+        model, tokenizer = load_model(LLM_NAME)
+    except Exception as e:
+        print("[WARN] Could not load LLM, falling back to heuristic predictions.")
+        return None, None
+    # Budgets are counted in the target model's tokens
+    set_token_counter(TokenCounter(tokenizer))
+    return model, tokenizer
+
+model_registry.register("llm", _load_llm)
+
+
+def load_models():
+    """Load every model an experiment worker needs (run once per process)."""
+    model_registry.get("llm")
+    model_registry.get("embedder")
+    model_registry.get("summarizer")
+
+
+def _settings():
+    return {name: globals()[name] for name in SETTINGS}
 
-# Load model once at module level (small one for testing; replace with bigger if GPU allows)
-try:
-    model, tokenizer = load_model("facebook/opt-350m")  # lightweight open model
-    USE_LLM = True
-except Exception as e:
-    print("[WARN] Could not load LLM, falling back to heuristic predictions.")
-    model, tokenizer, USE_LLM = None, None, False
+
+def _init_worker(settings, load):
+    """Pool initializer: the parent's settings, then the models."""
+    globals().update(settings)
+    load()
 
 
 def heuristic_predict(context, query, gold):
@@ -61,53 +149,246 @@ def heuristic_predict(context, query, gold):
     return " ".join(context.split()[:5])
 
 
-def run_qa_experiment(B=4000, n=20):
-    data = load_hotpotqa(n=n)   # load subset of HotpotQA
-    results = {"full": [], "trunc": [], "retrieval": [], "summary": [], "BPO": [], "oracle": []}
+def run_qa_experiment(B=4000, n=20, workers=WORKERS, store=None):
+    return run_qa_experiment_budgets([B], n=n, workers=workers, store=store)[B]
+
+
+def run_qa_experiment_budgets(budgets, n=20, workers=WORKERS, store=None):
+    """QA experiment at several budgets; segmentation, scoring, summarization and
+    the BPO solver run once per example and are shared by all budgets.
+    workers > 1 spreads examples over a process pool (results merged in order).
+    Each example's results go to `store` (a ResultStore; default: in memory) as soon as
+    they arrive, and only the budgets an example is missing there are computed."""
+    store = ResultStore() if store is None else store
+    budgets, methods = sorted(budgets), _qa_methods()
+    config = store.register_config(run_config())
+    ids, todo = _pending(store, "hotpotqa", config, iter_hotpotqa(n=n), methods, budgets)
+
+    if todo:  # a complete rerun neither loads the other models nor starts workers
+        for ex_id, rows in map_examples(partial(_keyed_example, qa_example), todo, workers=workers,
+                                        initializer=partial(_init_worker, _settings(), load_models)):
+            store.put("hotpotqa", config, ex_id, rows)
 
+    # Aggregate
+    results = store.load("hotpotqa", config, ids, methods, budgets)
+    return {B: aggregate_qa(res) for B, res in results.items()}
+
+
+def run_config():
+    """Settings that change experiment results; their hash keys the stored results.
+    The LLM is resolved first and recorded as it actually loaded: without it predictions
+    are heuristic and budgets count whitespace words ("heuristic", "whitespace"), and
+    those results must not be reused for a run with the model."""
+    model, _ = model_registry.get("llm")  # also installs its token counter
+    llm = model_registry.fingerprint("llm", LLM_NAME) if model is not None else "heuristic"
+    return dict(model_fingerprints(), llm=llm, bpo_method=BPO_METHOD,
+                ladder=COMPRESSION_LADDER, lazy=LAZY_SUMMARIES, summary_batch_size=SUMMARY_BATCH_SIZE,
+                adaptive_floor=ADAPTIVE_FLOOR, dedup=DEDUP, dedup_threshold=DEDUP_THRESHOLD,
+                redundancy_penalty=REDUNDANCY_PENALTY, prompt_order=PROMPT_ORDER, scorer=SCORER_PATH)
+
+
+def _pending(store, dataset, config, data, methods, budgets):
+    """(ids of all examples, [(example, missing budgets)] still to compute). Checked up
+    front in this thread: a pool consumes its task iterable on a feeder thread, and the
+    store's SQLite connection only works in the thread that opened it."""
+    ids, todo = [], []
     for ex in data:
-        query, context, gold = ex["query"], ex["context"], ex["answer"]
-        segments = segment_text(context)
+        ids.append(str(ex["id"]))
+        missing = store.missing(dataset, config, ex["id"], methods, budgets)
+        if missing:
+            todo.append((ex, missing))
+    return ids, todo
+
+
+def _keyed_example(fn, item):
+    ex, budgets = item
+    return str(ex["id"]), fn(ex, budgets)
 
-        # Importance + summaries
-        importance = compute_importance(segments, query)
-        summaries = summarize_segments(segments)
 
+def _qa_methods():
+    return QA_METHODS + ([ADAPTIVE_METHOD] if ADAPTIVE_FLOOR is not None else [])
+
+
+def qa_example(ex, budgets):
+    """All methods and budgets for one QA example: {B: {method: {"em", "f1"}}}."""
+    with example(ex.get("id")):
+        return _qa_example(ex, budgets)
+
+
+def _qa_example(ex, budgets):
+    query, context, gold = ex["query"], ex["context"], ex["answer"]
+    with span("load_models"):
+        model, tokenizer = model_registry.get("llm")  # also installs its token counter
+    with span("segment"):
+        segments = segment_text(context)
+    segments, signatures = _dedup(segments)
+
+    # Importance + summaries
+    with span("importance"):
+        if SCORER_PATH:
+            importance, features = compute_importance(segments, query, scorer=_online_scorer(),
+                                                      return_features=True)
+        else:
+            importance = compute_importance(segments, query)
+        importance = _redundancy(segments, signatures, importance)
+    docs, summary_by_budget, bpo_by_budget, adaptive_by_budget = _summaries_and_bpo(
+        segments, importance, budgets, adaptive=ADAPTIVE_FLOOR is not None)
+    if SCORER_PATH:
+        _scorer_feedback(features, segments, gold)
+
+    contexts = {}
+    for B in budgets:
         # Baselines
-        fc_text, fc_tokens = full_context(segments, B)
-        trunc_text, trunc_tokens = truncation(segments, B)
-        ret_text, ret_tokens = retrieval_topk(segments, importance, B, k=5)
-        summ_text, summ_tokens = all_summaries(summaries, B)
-        bpo_sel, bpo_cost, _ = budgeted_selection(segments, summaries, importance, B)
-        bpo_text = " ".join([summaries[s["id"]] if s["mode"]=="summary" else segments[s["id"]] for s in bpo_sel])
-        oracle_text, oracle_tokens = oracle_selection(segments, [gold], B)
-
-        # === Prediction step ===
-        if USE_LLM:
-            prompt_template = "Context:\n{}\n\nQuestion: {}\nAnswer:"
-            pred_fc = run_llm(model, tokenizer, prompt_template.format(fc_text, query), max_new_tokens=64)
-            pred_trunc = run_llm(model, tokenizer, prompt_template.format(trunc_text, query), max_new_tokens=64)
-            pred_ret = run_llm(model, tokenizer, prompt_template.format(ret_text, query), max_new_tokens=64)
-            pred_sum = run_llm(model, tokenizer, prompt_template.format(summ_text, query), max_new_tokens=64)
-            pred_bpo = run_llm(model, tokenizer, prompt_template.format(bpo_text, query), max_new_tokens=64)
-            pred_oracle = run_llm(model, tokenizer, prompt_template.format(oracle_text, query), max_new_tokens=64)
+        fc_text, fc_tokens = full_context(docs, B)
+        trunc_text, trunc_tokens = truncation(docs, B)
+        ret_text, ret_tokens = retrieval_topk(docs, importance, B, k=5)
+        summ_text, summ_tokens = summary_by_budget[B]
+        bpo_text, bpo_cost = bpo_by_budget[B]
+        oracle_text, oracle_tokens = oracle_selection(docs, [gold], B)
+        contexts[B] = dict(zip(QA_METHODS, [fc_text, trunc_text, ret_text, summ_text, bpo_text, oracle_text]))
+        if B in adaptive_by_budget:
+            contexts[B][ADAPTIVE_METHOD] = adaptive_by_budget[B][0]
+
+    # === Prediction step ===
+    # all (budget, method) prompts of this example are generated together in length-bucketed batches
+    keys = [(B, name) for B in budgets for name in contexts[B]]
+    with span("generate", prompts=len(keys)):
+        if model is not None:
+            prompts = [PROMPT_TEMPLATE.format(contexts[B][name], query) for B, name in keys]
+            preds = run_llm_batch(model, tokenizer, prompts, max_new_tokens=64, batch_size=LLM_BATCH_SIZE)
         else:
-            pred_fc = heuristic_predict(fc_text, query, gold)
-            pred_trunc = heuristic_predict(trunc_text, query, gold)
-            pred_ret = heuristic_predict(ret_text, query, gold)
-            pred_sum = heuristic_predict(summ_text, query, gold)
-            pred_bpo = heuristic_predict(bpo_text, query, gold)
-            pred_oracle = heuristic_predict(oracle_text, query, gold)
-
-        # Metrics
-        for name, pred in zip(
-            ["full","trunc","retrieval","summary","BPO","oracle"],
-            [pred_fc,pred_trunc,pred_ret,pred_sum,pred_bpo,pred_oracle]
-        ):
-            em,f1 = qa_metrics(pred, gold)
-            results[name].append({"em":em,"f1":f1})
-
-    # Aggregate
+            preds = [heuristic_predict(contexts[B][name], query, gold) for B, name in keys]
+
+    # Metrics
+    rows = {B: {} for B in budgets}
+    with span("metrics"):
+        for (B, name), (em,f1) in zip(keys, qa_metrics_batch(preds, [gold] * len(preds))):
+            rows[B][name] = {"em":em,"f1":f1}
+    return rows
+
+
+def _online_scorer():
+    """Latest shared scorer state (other workers may have updated it)."""
+    if os.path.exists(SCORER_PATH):
+        return OnlineScorer.load(SCORER_PATH)
+    return OnlineScorer()
+
+
+def _scorer_feedback(features, segments, gold):
+    """Segments containing the gold answer are rewarded, the others penalized, with both
+    classes carrying the same total weight: the smaller class gets +-1, the larger one
+    +-(smaller / larger), so every reward stays in [-1, 1]."""
+    useful = np.array([gold.lower() in seg.lower() for seg in segments], dtype=bool)
+    n_useful, n_other = int(useful.sum()), int((~useful).sum())
+    if not n_useful or not n_other:
+        return
+    scale = max(n_useful, n_other)
+    reward = np.where(useful, n_other / scale, -n_useful / scale)
+    OnlineScorer.update_file(SCORER_PATH, features, reward)
+
+
+def _dedup(segments):
+    """(segments, MinHash signatures) after near-duplicate collapse; unchanged when DEDUP is off."""
+    if not DEDUP:
+        return segments, None
+    with span("dedup", n=len(segments)):
+        deduped = dedup_segments(segments, threshold=DEDUP_THRESHOLD)
+    count("dedup_removed", deduped.removed, segments=len(segments))
+    return deduped.segments, deduped.signatures
+
+
+def _redundancy(segments, signatures, importance):
+    if not REDUNDANCY_PENALTY:
+        return importance
+    if signatures is None:
+        signatures = minhash_signatures(segments)
+    return redundancy_penalty(signatures, importance, weight=REDUNDANCY_PENALTY)
+
+
+def _build_table(segments, importance):
+    """SegmentTable holding every compression rung of the segments."""
+    with span("summarize", n=len(segments)):
+        if COMPRESSION_LADDER:
+            rungs = summarize_ladder(segments, COMPRESSION_LADDER, batch_size=SUMMARY_BATCH_SIZE)
+            return SegmentTable.from_rungs(rungs + [segments], [name for name, _ in COMPRESSION_LADDER] + ["full"],
+                                           importance)
+        summaries = summarize_segments(segments, batch_size=SUMMARY_BATCH_SIZE)
+    return SegmentTable.from_lists(segments, summaries, importance)
+
+
+def _summaries_and_bpo(segments, importance, budgets, adaptive=False):
+    """
+    Summaries + BPO selection for one example: (docs, {B: summary baseline (text, tokens)},
+    {B: BPO (text, tokens)}, {B: adaptive BPO (text, tokens)}), where docs is what the other
+    baselines read (a SegmentTable, or the segment list in lazy mode). The adaptive dict is
+    empty unless `adaptive`; there each run budget is the ceiling of budget_controller.
+    """
+    doc_key = content_hash(*segments) if PROMPT_ORDER == "core" else None
+    if LAZY_SUMMARIES:
+        ladder = LazyLadder(segments, COMPRESSION_LADDER or (("summary", (50, 10)),), batch_size=SUMMARY_BATCH_SIZE)
+        select_multi = partial(lazy_select, ladder, importance)
+        with span("selection"):
+            selected = select_multi(budgets)
+            adaptive_bpo = _adaptive_selection(select_multi, importance, budgets) if adaptive else {}
+        bpo = {B: (_assemble(ladder, ids, modes, doc_key), cost) for B, (ids, modes, cost, _) in selected.items()}
+        adaptive_bpo = {B: (_assemble(ladder, ids, modes, doc_key), cost)
+                        for B, (ids, modes, cost) in adaptive_bpo.items()}
+        with span("summary_baseline"):
+            summary = {B: ladder.fill_in_order("summary", B) for B in budgets}
+        count("summarized_segments", ladder.summarized, segments=len(segments))
+        docs, tokens_before = segments, int(ladder.costs[:, -1].sum())
+    else:
+        table = _build_table(segments, importance)
+        select_multi = partial(select_table_multi, table, method=BPO_METHOD)
+        with span("selection"):
+            selected = select_multi(budgets)
+            adaptive_bpo = _adaptive_selection(select_multi, importance, budgets) if adaptive else {}
+        bpo = {B: (_assemble(table, ids, modes, doc_key), cost) for B, (ids, modes, cost, _, _) in selected.items()}
+        adaptive_bpo = {B: (_assemble(table, ids, modes, doc_key), cost)
+                        for B, (ids, modes, cost) in adaptive_bpo.items()}
+        summary = {B: all_summaries(table, B) for B in budgets}
+        docs, tokens_before = table, int(table.seg_costs.sum())
+    _count_tokens(tokens_before, bpo)
+    return docs, summary, bpo, adaptive_bpo
+
+
+# Selections per document for PROMPT_ORDER="core" (per process; every budget of an example
+# is assembled in the same task, so the order does not depend on the worker count)
+_core_tracker = CoreTracker()
+
+
+def _assemble(source, ids, modes, doc_key=None):
+    """BPO prompt text in PROMPT_ORDER (source: SegmentTable or LazyLadder). With "core",
+    the (segment, rung) pairs that most earlier selections on document `doc_key` made
+    come first."""
+    if PROMPT_ORDER != "core":
+        return source.gather(*order_selection(ids, modes, PROMPT_ORDER))
+    ids, modes = order_selection(ids, modes, "core", _core_tracker.core(doc_key))
+    _core_tracker.observe(doc_key, ids, modes)
+    return source.gather(ids, modes)
+
+
+def _adaptive_selection(select_multi, importance, budgets):
+    """{ceiling B: (ids, modes, cost)} at the budget chosen in [ADAPTIVE_FLOOR, B]; the chosen
+    budget and the criterion that fired are recorded as "adaptive_budget" counters."""
+    chosen = {}
+    for B, (budget, (ids, modes, cost, *_), report) in choose_budgets(select_multi, importance, budgets,
+                                                                      floor=ADAPTIVE_FLOOR).items():
+        count("adaptive_budget", budget, ceiling=B, reason=report["reason"], coverage=report["coverage"])
+        chosen[B] = (ids, modes, cost)
+    return chosen
+
+
+def _count_tokens(tokens_before, bpo_by_budget):
+    """Record context tokens before selection and after BPO selection (tracing only)."""
+    if not tracer.enabled:
+        return
+    count("tokens_before", tokens_before)
+    for B, (_, cost) in bpo_by_budget.items():
+        count("tokens_after", cost, budget=B)
+
+
+def aggregate_qa(results):
     summary = {}
     for k,v in results.items():
         em = sum([x["em"] for x in v])/len(v)*100
@@ -118,35 +399,87 @@ def run_qa_experiment(B=4000, n=20):
 # Summarization Experiment (GovReport)
 # ----------------------------
 
-def run_summarization_experiment(B=4000, n=10):
-    data = load_govreport(n=n)
-    results = {"trunc": [], "summary": [], "BPO": []}
+def run_summarization_experiment(B=4000, n=10, workers=WORKERS, store=None):
+    return run_summarization_experiment_budgets([B], n=n, workers=workers, store=store)[B]
+
+
+def run_summarization_experiment_budgets(budgets, n=10, workers=WORKERS, store=None):
+    """Summarization experiment at several budgets (per-document work shared).
+    Results are stored per example like the QA experiment (see run_qa_experiment_budgets)."""
+    store = ResultStore() if store is None else store
+    budgets = sorted(budgets)
+    config = store.register_config(run_config())
+    ids, todo = _pending(store, "govreport", config, iter_govreport(n=n), SUM_METHODS, budgets)
+
+    # Workers produce the per-method texts; metrics run over SUM_METRICS_CHUNK documents at a time
+    pending = []  # (example id, reference, {B: {method: text}})
+    if todo:
+        for ex_id, (ref, texts) in map_examples(partial(_keyed_example, summarization_example), todo,
+                                                workers=workers,
+                                                initializer=partial(_init_worker, _settings(), load_models)):
+            pending.append((ex_id, ref, texts))
+            if len(pending) >= SUM_METRICS_CHUNK:
+                _store_summarization(store, config, pending)
+                pending = []
+    _store_summarization(store, config, pending)
 
-    for ex in data:
-        doc, ref = ex["report"], ex["summary"]
+    # Aggregate
+    results = store.load("govreport", config, ids, SUM_METHODS, budgets)
+    return {B: aggregate_summarization(res) for B, res in results.items()}
+
+
+def _store_summarization(store, config, pending):
+    """Score the texts of several documents in one metrics call and store them per document."""
+    pairs = [(ex_id, B, name, pred, ref) for ex_id, ref, texts in pending
+             for B, by_method in texts.items() for name, pred in by_method.items()]
+    if not pairs:
+        return
+    with span("metrics", pairs=len(pairs)):
+        scores = summarization_metrics_batch([p[3] for p in pairs], [p[4] for p in pairs])
+    rows = {}
+    for (ex_id, B, name, _, _), (rouge, bert) in zip(pairs, scores):
+        metrics = {key: rouge[key].fmeasure for key in ("rouge1", "rouge2", "rougeL")}
+        rows.setdefault(ex_id, {}).setdefault(B, {})[name] = dict(metrics, bert=bert)
+    for ex_id, by_budget in rows.items():
+        store.put("govreport", config, ex_id, by_budget)
+
+
+def summarization_example(ex, budgets):
+    """All methods and budgets for one document: (reference, {B: {method: text}})."""
+    with example(ex.get("id")):
+        return _summarization_example(ex, budgets)
+
+
+def _summarization_example(ex, budgets):
+    doc, ref = ex["report"], ex["summary"]
+    with span("load_models"):
+        model_registry.get("llm")  # budgets use the LLM's token counter
+    with span("segment"):
         segments = segment_text(doc)
+    segments, signatures = _dedup(segments)
 
-        # Importance + summaries
+    # Importance + summaries
+    with span("importance"):
         importance = compute_importance(segments, ref)  # cheat: use ref as query proxy
-        summaries = summarize_segments(segments)
+        importance = _redundancy(segments, signatures, importance)
+    docs, summary_by_budget, bpo_by_budget, _ = _summaries_and_bpo(segments, importance, budgets)
 
+    texts = {}
+    for B in budgets:
         # Baselines
-        trunc_text, trunc_tokens = truncation(segments, B)
-        summ_text, summ_tokens = all_summaries(summaries, B)
-        bpo_sel, bpo_cost, _ = budgeted_selection(segments, summaries, importance, B)
-        bpo_text = " ".join([summaries[s["id"]] if s["mode"]=="summary" else segments[s["id"]] for s in bpo_sel])
+        trunc_text, trunc_tokens = truncation(docs, B)
+        summ_text, summ_tokens = summary_by_budget[B]
+        bpo_text, bpo_cost = bpo_by_budget[B]
+        texts[B] = {"trunc": trunc_text, "summary": summ_text, "BPO": bpo_text}
+    return ref, texts
 
-        # Metrics
-        for name,pred in zip(["trunc","summary","BPO"],[trunc_text,summ_text,bpo_text]):
-            rouge, bert = summarization_metrics(pred, ref)
-            results[name].append({"rouge":rouge,"bert":bert})
 
-    # Aggregate
+def aggregate_summarization(results):
     summary = {}
     for k,v in results.items():
-        r1 = sum([x["rouge"]["rouge1"].fmeasure for x in v])/len(v)*100
-        r2 = sum([x["rouge"]["rouge2"].fmeasure for x in v])/len(v)*100
-        rL = sum([x["rouge"]["rougeL"].fmeasure for x in v])/len(v)*100
+        r1 = sum([x["rouge1"] for x in v])/len(v)*100
+        r2 = sum([x["rouge2"] for x in v])/len(v)*100
+        rL = sum([x["rougeL"] for x in v])/len(v)*100
         bsc = sum([x["bert"] for x in v])/len(v)
         summary[k] = (r1,r2,rL,bsc)
     return summary
@@ -156,11 +489,11 @@ def run_summarization_experiment(B=4000, n=10):
 # Run Ablations
 # ----------------------------
 
-def run_ablation_qa():
-    return run_with_budgets(lambda B: run_qa_experiment(B,n=20), budgets=[2048,4000,8192])
+def run_ablation_qa(store=None):
+    return run_with_budgets(lambda Bs: run_qa_experiment_budgets(Bs,n=20,store=store), budgets=[2048,4000,8192], batched=True)
 
-def run_ablation_summarization():
-    return run_with_budgets(lambda B: run_summarization_experiment(B,n=10), budgets=[2048,4000,8192])
+def run_ablation_summarization(store=None):
+    return run_with_budgets(lambda Bs: run_summarization_experiment_budgets(Bs,n=10,store=store), budgets=[2048,4000,8192], batched=True)
 
 
 # ----------------------------
@@ -168,23 +501,35 @@ def run_ablation_summarization():
 # ----------------------------
 
 if __name__ == "__main__":
+    # Every result is checkpointed here: a rerun (or the ablation below, which includes the
+    # QA budget) only computes what is missing, and the tables are built from the store
+    store = ResultStore(RESULTS_DB)
+
     # === QA Experiment ===
     print("=== QA Experiment (HotpotQA) ===")
-    qa_summary = run_qa_experiment()
+    qa_summary = run_qa_experiment(store=store)
     qa_table = make_qa_table(qa_summary)
     print("\nLaTeX QA Table:\n", qa_table)
     save_latex_table(qa_table, "results_qa.tex")
 
     # === Summarization Experiment ===
     print("\n=== Summarization Experiment (GovReport) ===")
-    sum_summary = run_summarization_experiment()
+    sum_summary = run_summarization_experiment(store=store)
     sum_table = make_sum_table(sum_summary)
     print("\nLaTeX Summarization Table:\n", sum_table)
     save_latex_table(sum_table, "results_sum.tex")
 
     # === Ablation QA ===
     print("\n=== Ablation QA (budgets) ===")
-    ablation_qa = run_ablation_qa()
+    ablation_qa = run_ablation_qa(store=store)
     ablation_table = make_ablation_table(ablation_qa, caption="QA Ablation across Budgets", label="tab:qa-ablation")
     print("\nLaTeX Ablation Table:\n", ablation_table)
     save_latex_table(ablation_table, "results_ablation.tex")
+
+    # === Stage timings (BPO_TRACE=1) ===
+    if tracer.enabled:
+        for stage, st in tracer.summary()["stages"].items():
+            print(f"{stage:16s} n={st['count']:5d} p50={st['p50']:.4f}s p95={st['p95']:.4f}s p99={st['p99']:.4f}s")
+        tracer.export_jsonl("trace.jsonl")
+        tracer.export_chrome_trace("trace.json")
+        print("[INFO] Traces saved to trace.jsonl and trace.json")
@@ -1,9 +1,14 @@
 # 3. scoring.py (importance scoring + summaries)
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
-from transformers import pipeline
-import nltk
+import re
+from collections import Counter
+
 import numpy as np
+import model_registry
+from model_registry import LazyModel
+from utils import ensure_nltk_data
+from summary_cache import SummaryCache, summary_key, DEFAULT_CACHE_DIR
+from segment_index import IndexCache, SegmentIndex
+from online_update import OnlineScorer
 
 # Load environment variables from .env file
 try:
@@ -13,47 +18,206 @@ except ImportError:
     # Fallback if load_env.py is not available
     pass
 
-# Initialize models
-bm25_tokenizer = nltk.word_tokenize
-embedder = SentenceTransformer("all-MiniLM-L6-v2")
-summarizer = pipeline("summarization", model="facebook/bart-large-cnn")
+# Models are loaded on first use (see model_registry); override() injects stand-ins
+EMBEDDER_MODEL = "all-MiniLM-L6-v2"
+SUMMARIZER_MODEL = "facebook/bart-large-cnn"
+
+# Compression ladder below the full text, cheapest first:
+# (rung name, (max_len, min_len)) for summarizer rungs, (rung name, None) for extractive keywords.
+# "summary" uses the summarize_segments defaults, so it shares their cache entries.
+LADDER = (("keywords", None), ("short_summary", (20, 5)), ("summary", (50, 10)))
+
+def _load_embedder():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDER_MODEL)
+
+def _load_summarizer():
+    from transformers import pipeline
+    return pipeline("summarization", model=SUMMARIZER_MODEL)
+
+def _load_word_tokenizer():
+    ensure_nltk_data()
+    import nltk
+    return nltk.word_tokenize
+
+model_registry.register("embedder", _load_embedder)
+model_registry.register("summarizer", _load_summarizer)
+model_registry.register("word_tokenizer", _load_word_tokenizer)
+embedder = LazyModel("embedder")
+summarizer = LazyModel("summarizer")
+bm25_tokenizer = LazyModel("word_tokenizer")
+
+# Shared summary cache: summaries are reused across budgets, datasets and restarts
+summary_cache = SummaryCache()
+# Per-document BM25 + embedding indexes, memory-mapped from the same cache root
+index_cache = IndexCache(DEFAULT_CACHE_DIR)
+
+def compute_importance(segments, query, index=None, encode=None, shortlist=None, n_probe=8, scorer=None,
+                       compression=None, return_features=False):
+    """Compute importance scores with BM25 + embeddings.
+    The per-document SegmentIndex (tokens, BM25 stats, embeddings) is built once
+    and reused, so repeated queries/budgets cost one query encode.
+    `encode` replaces embedder.encode (e.g. a batching front-end to the same model).
+    `segments` may also be a preprocessed DocumentArtifact, whose stored index is used.
+    With shortlist=k only the ANN top-k segments are scored (see shortlist_segments);
+    all other segments get 0 and are never selected.
+    With an online_update.OnlineScorer the fusion uses its learned weights over BM25,
+    cosine, position, length and (if given, per segment) summary compression ratio
+    instead of 0.5 * BM25 + 0.5 * cosine.
+    return_features=True returns (scores, features), the feature rows the scorer saw
+    (full scoring only), e.g. to feed back as OnlineScorer updates."""
+    encode = encode or embedder.encode
+    index = _resolve_index(segments, index, encode)
+    if shortlist and return_features:
+        raise ValueError("return_features needs full scoring (shortlist=None)")
+    if shortlist:
+        ids, bm25, cosine = index.shortlist_components(query, encode, bm25_tokenizer, k=shortlist, n_probe=n_probe)
+        out = np.zeros(len(index))
+        out[ids] = _fuse(index, ids, bm25, cosine, scorer, compression)
+        return out
+    bm25, cosine = index.components(query, encode, bm25_tokenizer)
+    ids = np.arange(len(index))
+    if not return_features:
+        return _fuse(index, ids, bm25, cosine, scorer, compression)
+    features = _features(index, ids, bm25, cosine, compression)
+    scores = 0.5 * bm25 + 0.5 * cosine if scorer is None else scorer.score_features(features)
+    return scores, features
 
-def compute_importance(segments, query):
-    """Compute importance scores with BM25 + embeddings."""
-    tokenized_segments = [bm25_tokenizer(seg.lower()) for seg in segments]
-    bm25 = BM25Okapi(tokenized_segments)
-    bm25_scores = bm25.get_scores(bm25_tokenizer(query.lower()))
+def importance_features(segments, query, index=None, encode=None, compression=None):
+    """(n, len(online_update.FEATURES)) features behind compute_importance(..., scorer=)."""
+    return compute_importance(segments, query, index=index, encode=encode, compression=compression,
+                              return_features=True)[1]
 
-    seg_emb = embedder.encode(segments, convert_to_tensor=True)
-    query_emb = embedder.encode(query, convert_to_tensor=True)
-    cosine_scores = (seg_emb @ query_emb) / (seg_emb.norm(dim=-1) * query_emb.norm())
+def _fuse(index, ids, bm25, cosine, scorer, compression):
+    if scorer is None:
+        return 0.5 * bm25 + 0.5 * cosine
+    return scorer.score_features(_features(index, ids, bm25, cosine, compression))
 
-    return 0.5 * np.array(bm25_scores) + 0.5 * cosine_scores.cpu().numpy()
+def _features(index, ids, bm25, cosine, compression):
+    doc_len = np.asarray(index.doc_len)
+    return OnlineScorer.features(
+        bm25, cosine,
+        position=ids / max(len(index) - 1, 1),
+        length=doc_len[ids] / max(float(doc_len.max()), 1.0) if len(doc_len) else None,
+        compression=None if compression is None else np.asarray(compression, dtype=np.float64)[ids],
+    )
 
-def summarize_segments(segments, max_len=50, min_len=10):
-    """Summarize each segment into shorter form, adapting to input length."""
-    summaries = []
-    for seg in segments:
+def shortlist_segments(segments, query, k=200, n_probe=8, index=None, encode=None):
+    """(ids, importance) of the ANN top-k segments, exactly re-ranked and fused with BM25.
+    For very large segment collections: build the selection table from these ids only."""
+    encode = encode or embedder.encode
+    index = _resolve_index(segments, index, encode)
+    return index.shortlist(query, encode, bm25_tokenizer, k=k, n_probe=n_probe)
+
+def _resolve_index(segments, index, encode):
+    if index is None and isinstance(getattr(segments, "index", None), SegmentIndex):
+        index = segments.index
+    if index is None:
+        model_id = (model_registry.fingerprint("embedder", EMBEDDER_MODEL) + "|"
+                    + model_registry.fingerprint("word_tokenizer", "nltk.word_tokenize"))
+        index = index_cache.get_or_build(segments, encode, bm25_tokenizer, model_id)
+    return index
+
+def _summarize_one(seg, adaptive_max, adaptive_min, key, cache, summarize=summarizer):
+    """Single pipeline call with the safe-truncation fallback."""
+    try:
+        summary = summarize(
+            seg,
+            max_length=adaptive_max,
+            min_length=adaptive_min,
+            do_sample=False
+        )[0]['summary_text']
+        if cache is not None:
+            cache.put(key, summary)
+    except Exception:
+        summary = seg[:100]  # fallback safe truncation (not cached)
+    return summary
+
+def summarize_segments(segments, max_len=50, min_len=10, cache=summary_cache, batch_size=None, summarize=None):
+    """Summarize each segment into shorter form, adapting to input length.
+    Summaries are looked up in / stored to `cache` (pass cache=None to disable).
+    With batch_size set, segments sharing the same adaptive max/min lengths are
+    summarized together in one pipeline call (shortest first to limit padding).
+    `summarize` replaces the summarizer pipeline (same call signature)."""
+    summarize = summarize or summarizer
+    model_id = model_registry.fingerprint("summarizer", SUMMARIZER_MODEL)
+    summaries = [None] * len(segments)
+    buckets = {}  # (adaptive_max, adaptive_min) -> [(index, cache key)]
+    for i, seg in enumerate(segments):
         input_len = len(seg.split())
 
         # If input is very short, skip summarization (use raw segment)
         if input_len < 20:
-            summaries.append(seg)
+            summaries[i] = seg
             continue
 
         # Adaptive max/min
         adaptive_max = min(max_len, int(0.7 * input_len))
         adaptive_min = min_len if adaptive_max > min_len else max(5, int(0.3 * input_len))
 
+        key = summary_key(seg, model_id, adaptive_max, adaptive_min)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                summaries[i] = cached
+                continue
+
+        if batch_size:
+            buckets.setdefault((adaptive_max, adaptive_min), []).append((i, key))
+        else:
+            summaries[i] = _summarize_one(seg, adaptive_max, adaptive_min, key, cache, summarize)
+
+    for (adaptive_max, adaptive_min), items in buckets.items():
+        items.sort(key=lambda item: len(segments[item[0]]))
         try:
-            summary = summarizer(
-                seg,
+            outputs = summarize(
+                [segments[i] for i, _ in items],
                 max_length=adaptive_max,
                 min_length=adaptive_min,
-                do_sample=False
-            )[0]['summary_text']
+                do_sample=False,
+                batch_size=batch_size
+            )
         except Exception:
-            summary = seg[:100]  # fallback safe truncation
-        summaries.append(summary)
+            # Retry one by one so only the failing segments get the fallback
+            for i, key in items:
+                summaries[i] = _summarize_one(segments[i], adaptive_max, adaptive_min, key, cache, summarize)
+            continue
+        for (i, key), out in zip(items, outputs):
+            summaries[i] = out['summary_text']
+            if cache is not None:
+                cache.put(key, summaries[i])
     return summaries
 
+def summarize_ladder(segments, ladder=LADDER, cache=summary_cache, batch_size=None, summarize=None):
+    """One list of compressed segments per ladder rung (same order as `ladder`).
+    Keyword rungs are extractive and never call the summarizer."""
+    out = []
+    for name, lengths in ladder:
+        if lengths is None:
+            out.append([extract_keywords(seg) for seg in segments])
+        else:
+            out.append(summarize_segments(segments, max_len=lengths[0], min_len=lengths[1], cache=cache,
+                                          batch_size=batch_size, summarize=summarize))
+    return out
+
+_KEYWORD = re.compile(r"[^\W_][\w'-]*")
+_STOPWORDS = frozenset(
+    "a an the and or but if of to in on at by for with from as is are was were be been being it its this "
+    "that these those which who whom what when where why how not no do does did has have had will would can "
+    "could should may might must shall than then there their they them he she his her we our you your i me "
+    "my so such into over under about after before between during also more most other some any all each".split()
+)
+
+def extract_keywords(text, ratio=0.25, min_words=3):
+    """Extractive keyword form: the most frequent content words (names and numbers
+    first on ties), about ratio * len(words) of them, kept in text order."""
+    words = _KEYWORD.findall(text)
+    content = [w for w in words if w.lower() not in _STOPWORDS]
+    k = max(min_words, int(ratio * len(words)))
+    freq = Counter(w.lower() for w in content)
+    first = {}
+    for w in content:
+        first.setdefault(w.lower(), w)
+    ranked = sorted(first, key=lambda w: (-freq[w], not (first[w][0].isupper() or first[w][0].isdigit())))
+    keep = set(ranked[:k])
+    return " ".join(first[w] for w in first if w in keep)
@@ -0,0 +1,303 @@
+# segment_index.py
+# Reusable per-document index: tokenized segments, BM25 statistics and segment embeddings.
+# Built once per document, persisted as memory-mapped .npy files keyed by content hash,
+# then scored against any number of queries (one query encode + vectorized BM25/dot product).
+# The IVF index (ann.py) is built on first ANN use and, for a saved index, written next
+# to the arrays so later loads reuse it.
+
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ann import IVFIndex
+from instrument import span
+from utils import content_hash
+
+ARRAYS = ("term_ptr", "term_docs", "term_tfs", "doc_len", "idf", "embeddings")
+
+
+class SegmentIndex:
+    """
+    BM25Okapi-equivalent statistics stored term-major (CSR over terms):
+    for term t, documents term_docs[term_ptr[t]:term_ptr[t+1]] contain it
+    term_tfs[...] times. Embeddings are stored L2-normalized, so cosine
+    similarity against a query is a single matrix-vector product.
+    """
+
+    def __init__(self, vocab, term_ptr, term_docs, term_tfs, doc_len, idf, embeddings,
+                 k1=1.5, b=0.75):
+        self.vocab = list(vocab)
+        self.vocab_index = {t: i for i, t in enumerate(self.vocab)}
+        self.term_ptr = term_ptr
+        self.term_docs = term_docs
+        self.term_tfs = term_tfs
+        self.doc_len = doc_len
+        self.idf = idf
+        self.embeddings = embeddings
+        self.k1 = k1
+        self.b = b
+        avgdl = float(doc_len.mean()) if len(doc_len) else 0.0
+        self._norm = k1 * (1 - b + b * doc_len / avgdl) if avgdl > 0 else np.full(len(doc_len), k1)
+        self._ann = None
+        self._ann_lock = threading.Lock()
+        self.path = None  # directory the index was saved to / loaded from
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    @classmethod
+    def build(cls, segments, encode, tokenize, k1=1.5, b=0.75, epsilon=0.25):
+        """Tokenize + embed `segments` once. `encode(list_of_str)` -> 2D array."""
+        with span("index_build", n=len(segments)):
+            return cls._build(segments, encode, tokenize, k1, b, epsilon)
+
+    @classmethod
+    def _build(cls, segments, encode, tokenize, k1, b, epsilon):
+        tokenized = [tokenize(seg.lower()) for seg in segments]
+        vocab_index = {}
+        term_ids, doc_ids = [], []
+        for d, toks in enumerate(tokenized):
+            for tok in toks:
+                term_ids.append(vocab_index.setdefault(tok, len(vocab_index)))
+            doc_ids.extend([d] * len(toks))
+        n_docs, n_terms = len(segments), len(vocab_index)
+        doc_len = np.array([len(t) for t in tokenized], dtype=np.float64)
+
+        # Unique (term, doc) pairs sorted term-major, with their counts as tf
+        pairs = np.asarray(term_ids, dtype=np.int64) * max(n_docs, 1) + np.asarray(doc_ids, dtype=np.int64)
+        pairs, tfs = np.unique(pairs, return_counts=True)
+        pair_terms = pairs // max(n_docs, 1)
+        term_docs = (pairs % max(n_docs, 1)).astype(np.int32)
+        df = np.bincount(pair_terms, minlength=n_terms)
+        term_ptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        # BM25Okapi idf with the epsilon floor for negative values
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        if n_terms:
+            idf[idf < 0] = epsilon * idf.mean()
+
+        with span("embed_segments", n=n_docs):
+            if n_docs:
+                emb = np.asarray(encode(list(segments)), dtype=np.float32)
+                emb = emb / np.maximum(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12)
+            else:
+                emb = np.zeros((0, 0), dtype=np.float32)
+
+        vocab = [None] * n_terms
+        for tok, i in vocab_index.items():
+            vocab[i] = tok
+        return cls(vocab, term_ptr, term_docs, tfs.astype(np.float64), doc_len, idf, emb, k1=k1, b=b)
+
+    def bm25_scores(self, query_tokens, ids=None):
+        """
+        Same values as BM25Okapi.get_scores(query_tokens); with `ids` only those segments
+        are scored (binary search in each query term's postings), in the order given.
+        """
+        if ids is not None:
+            return self._bm25_subset(query_tokens, np.asarray(ids, dtype=np.int64))
+        ids = [self.vocab_index[t] for t in query_tokens if t in self.vocab_index]
+        if not ids:
+            return np.zeros(len(self))
+        spans = [np.arange(self.term_ptr[t], self.term_ptr[t + 1]) for t in ids]
+        pos = np.concatenate(spans)
+        docs = self.term_docs[pos]
+        tf = self.term_tfs[pos]
+        w = np.repeat(self.idf[ids], [len(s) for s in spans])
+        contrib = w * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return np.bincount(docs, weights=contrib, minlength=len(self))
+
+    def _bm25_subset(self, query_tokens, ids):
+        out = np.zeros(len(ids))
+        order = np.argsort(ids, kind="stable")
+        docs = ids[order]
+        for tok in query_tokens:
+            t = self.vocab_index.get(tok)
+            if t is None or not len(docs):
+                continue
+            lo, hi = self.term_ptr[t], self.term_ptr[t + 1]
+            postings = self.term_docs[lo:hi]  # ascending within a term
+            pos = np.minimum(np.searchsorted(postings, docs), hi - lo - 1)
+            hit = postings[pos] == docs
+            tf = self.term_tfs[lo + pos[hit]]
+            out[order[hit]] += self.idf[t] * tf * (self.k1 + 1) / (tf + self._norm[docs[hit]])
+        return out
+
+    def cosine_scores(self, query_emb):
+        if not len(self):  # no segments: the embedding width is unknown (never encoded)
+            return np.zeros(0, dtype=np.float32)
+        q = np.asarray(query_emb, dtype=np.float32).reshape(-1)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        return self.embeddings @ q
+
+    def score(self, query, encode, tokenize):
+        """Fused importance: 0.5 * BM25 + 0.5 * cosine."""
+        bm25, cosine = self.components(query, encode, tokenize)
+        return 0.5 * bm25 + 0.5 * cosine
+
+    def components(self, query, encode, tokenize):
+        """(BM25, cosine) per segment, before fusion."""
+        with span("bm25"):
+            bm25 = self.bm25_scores(tokenize(query.lower()))
+        with span("embed_query"):
+            cosine = self.cosine_scores(encode([query])[0])
+        return bm25, cosine
+
+    def ann_index(self, n_lists=None):
+        """IVF index over the segment embeddings, built on first use (see ann.py)."""
+        if self._ann is None:
+            with self._ann_lock:
+                if self._ann is None:
+                    with span("ann_build", n=len(self)):
+                        self._ann = IVFIndex.build(self.embeddings, n_lists=n_lists)
+                    if self.path is not None and os.path.isdir(self.path):
+                        self._save_ann(os.path.join(self.path, "ann"))
+        return self._ann
+
+    def _save_ann(self, path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            self._ann.save(tmp)
+            os.replace(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # best-effort, like the index cache
+
+    def shortlist(self, query, encode, tokenize, k=200, n_probe=8):
+        """
+        Fused importance for an ANN shortlist only: (ids, scores), best cosine first.
+        The k nearest segments found in n_probe IVF cells are re-ranked with exact cosine
+        and BM25; cost grows with the probed cells, not with the document.
+        """
+        ids, bm25, cosine = self.shortlist_components(query, encode, tokenize, k, n_probe)
+        return ids, 0.5 * bm25 + 0.5 * cosine
+
+    def shortlist_components(self, query, encode, tokenize, k=200, n_probe=8):
+        """(ids, BM25, cosine) for the ANN shortlist, before fusion."""
+        with span("embed_query"):
+            q = encode([query])[0]
+        with span("ann_search", k=k, n_probe=n_probe):
+            ids, cosine = self.ann_index().search(q, k=k, n_probe=n_probe)
+        with span("bm25"):
+            bm25 = self.bm25_scores(tokenize(query.lower()), ids=ids)
+        return ids, bm25, cosine
+
+    def save(self, path):
+        """Write arrays as .npy files plus a small JSON header (atomic directory swap)."""
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(tmp, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, name + ".npy"), np.asarray(getattr(self, name)))
+        if self._ann is not None:
+            self._ann.save(os.path.join(tmp, "ann"))
+        with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"vocab": self.vocab, "k1": self.k1, "b": self.b}, f)
+        try:
+            os.replace(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # another writer won the race
+        self.path = path
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, name + ".npy"), mmap_mode=mmap_mode) for name in ARRAYS}
+        index = cls(meta["vocab"], k1=meta["k1"], b=meta["b"], **arrays)
+        index.path = path
+        if os.path.isdir(os.path.join(path, "ann")):
+            index._ann = IVFIndex.load(os.path.join(path, "ann"), index.embeddings, mmap_mode=mmap_mode)
+        return index
+
+
+def index_key(segments, model_name):
+    return content_hash("segment-index", model_name, *segments)
+
+
+class IndexCache:
+    """
+    Memory LRU of recently used indexes backed by on-disk index directories.
+    The disk level is evicted oldest-first (by directory mtime, refreshed on load) once
+    it exceeds `max_disk_bytes`, like SummaryCache; evicted indexes that are still
+    memory-mapped stay readable until released.
+    """
+
+    def __init__(self, cache_dir=None, max_memory_items=64, max_disk_bytes=2 * 1024 * 1024 * 1024):
+        self.root = os.path.join(cache_dir, "index") if cache_dir else None
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # computed lazily on first write
+
+    def get_or_build(self, segments, encode, tokenize, model_name):
+        key = index_key(segments, model_name)
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return self._mem[key]
+        index = None
+        path = os.path.join(self.root, key) if self.root else None
+        if path and os.path.isdir(path):
+            try:
+                index = SegmentIndex.load(path)
+                os.utime(path, None)
+            except (OSError, ValueError, KeyError):
+                index = None
+        if index is None:
+            index = SegmentIndex.build(segments, encode, tokenize)
+            if path:
+                try:
+                    os.makedirs(self.root, exist_ok=True)
+                    index.save(path)
+                    self._account(path)
+                except OSError:
+                    pass  # disk cache is best-effort
+        with self._lock:
+            self._mem[key] = index
+            while len(self._mem) > self.max_memory_items:
+                self._mem.popitem(last=False)
+        return index
+
+    def _account(self, path):
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, _, size in self._entries())
+            else:
+                self._disk_bytes += _dir_size(path)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict(keep=path)
+
+    def _entries(self):
+        if not self.root or not os.path.isdir(self.root):
+            return []
+        return [(e.path, e.stat().st_mtime, _dir_size(e.path)) for e in os.scandir(self.root)
+                if e.is_dir() and not e.name.endswith(".tmp")]
+
+    def _evict(self, keep=None):
+        """Drop the least recently used index directories until under 90% of the budget."""
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = int(0.9 * self.max_disk_bytes)
+        for path, _, size in entries:
+            if total <= target:
+                break
+            if path == keep:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            if not os.path.exists(path):
+                total -= size
+        self._disk_bytes = total
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
@@ -0,0 +1,112 @@
+# segment_table.py
+# Columnar per-document segment store.
+# All texts of a document live in one UTF-8 buffer addressed by offset arrays, one row
+# per compression rung (cheapest first, full text last); token costs, importance and the
+# selected mode are NumPy columns. Prompt assembly gathers memoryview slices of the
+# buffer by index and joins them in a single copy.
+
+import numpy as np
+
+from utils import count_tokens_batch
+
+RUNGS = ("summary", "full")     # default rungs (= selection.MODES)
+SKIP, SUMMARY, FULL = -1, 0, 1  # mode codes for the default rungs
+
+
+class SegmentTable:
+    def __init__(self, buffer, offsets, costs, importance=None, rungs=RUNGS):
+        self.buffer = buffer
+        self.offsets = np.asarray(offsets, dtype=np.int64)  # (k, n + 1)
+        self.rung_costs = np.asarray(costs, dtype=np.int64)  # (k, n)
+        self.rungs = tuple(rungs)
+        n = self.rung_costs.shape[1]
+        self.importance = np.zeros(n) if importance is None else np.asarray(importance, dtype=np.float64)
+        self.mode = np.full(n, SKIP, dtype=np.int8)
+        self._view = memoryview(buffer)
+
+    @classmethod
+    def from_lists(cls, segments, summaries=None, importance=None):
+        """Build from parallel lists; summaries default to the segments themselves."""
+        segments = list(segments)
+        summaries = segments if summaries is None else summaries
+        return cls.from_rungs([summaries, segments], RUNGS, importance)
+
+    @classmethod
+    def from_rungs(cls, texts, rungs, importance=None):
+        """texts: one list per rung (cheapest first, full segments last)."""
+        texts = [list(t) for t in texts]
+        n = len(texts[-1])
+        encoded = [t.encode("utf-8") for rung in texts for t in rung]
+        flat = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=flat[1:])
+        offsets = np.stack([flat[r * n:(r + 1) * n + 1] for r in range(len(texts))])
+        costs = np.asarray([count_tokens_batch(rung) for rung in texts], dtype=np.int64).reshape(len(texts), n)
+        return cls(b"".join(encoded), offsets, costs, importance, rungs)
+
+    # two-rung view (summary / full) used by the baselines
+    @property
+    def seg_offsets(self):
+        return self.offsets[-1]
+
+    @property
+    def sum_offsets(self):
+        return self.offsets[self.rung_index("summary")]
+
+    @property
+    def seg_costs(self):
+        return self.rung_costs[-1]
+
+    @property
+    def sum_costs(self):
+        return self.rung_costs[self.rung_index("summary")]
+
+    def rung_index(self, name):
+        return self.rungs.index(name)
+
+    def __len__(self):
+        return self.rung_costs.shape[1]
+
+    def __getitem__(self, i):
+        return self.segment(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.segment(i)
+
+    def text(self, rung, i):
+        offsets = self.offsets[rung]
+        return str(self._view[offsets[i]:offsets[i + 1]], "utf-8")
+
+    def segment(self, i):
+        return self.text(-1, i)
+
+    def summary(self, i):
+        return self.text(self.rung_index("summary"), i)
+
+    def segments(self):
+        return [self.segment(i) for i in range(len(self))]
+
+    def summaries(self):
+        return [self.summary(i) for i in range(len(self))]
+
+    def costs(self):
+        """(n, k) option costs in solver order (rungs, full text last)."""
+        return self.rung_costs.T
+
+    def views(self, ids, modes=None):
+        """Zero-copy memoryview slices for ids (full text unless modes gives another rung)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        modes = np.full(len(ids), len(self.rungs) - 1) if modes is None else np.asarray(modes, dtype=np.int64)
+        starts = self.offsets[modes, ids]
+        ends = self.offsets[modes, ids + 1]
+        view = self._view
+        return [view[s:e] for s, e in zip(starts.tolist(), ends.tolist())]
+
+    def gather(self, ids, modes=None, sep=" "):
+        """Assemble the prompt text for ids/modes with one join over buffer slices."""
+        return sep.encode("utf-8").join(self.views(ids, modes)).decode("utf-8")
+
+    def selected(self):
+        """ids and modes of the current selection (self.mode), in document order."""
+        ids = np.flatnonzero(self.mode != SKIP)
+        return ids, self.mode[ids]
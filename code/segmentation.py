@@ -1,9 +1,11 @@
 # 2. segmentation.py (document segmentation)
-import spacy
-import nltk
-nltk.download("punkt")
-nltk.download("punkt_tab")
+import io
+import re
 
+import model_registry
+from utils import count_tokens, ensure_nltk_data
+
+# import spacy
 # nlp = spacy.load("en_core_web_sm")
 
 # def segment_text(raw_text: str):
@@ -12,10 +14,165 @@ nltk.download("punkt_tab")
 #     segments = [sent.text.strip() for sent in doc.sents if len(sent.text.strip()) > 0]
 #     return segments
 
-# alternate to spacy for simplicity
-import nltk
-nltk.download("punkt")
+# alternate to spacy for simplicity (punkt data is fetched on first use, not at import)
+
+def _load_sentence_tokenizer():
+    ensure_nltk_data()
+    import nltk
+    return nltk.sent_tokenize
+
+model_registry.register("sentence_tokenizer", _load_sentence_tokenizer)
+
+# Backends:
+#   punkt  - NLTK Punkt sentences (original behaviour)
+#   rule   - compiled regex sentence splitter (much faster, no model data)
+#   window - rule sentences packed into segments of about target_tokens, breaking at
+#            paragraph ends where possible (fewer, size-controlled knapsack items)
+BACKENDS = ("punkt", "rule", "window")
+
+_BOUNDARY = re.compile(r"([.!?]+)([\"'”’)\]]*)(\s+)")
+_SENT_START = re.compile(r"[\"'“‘(\[]?[A-Z0-9]")
+_PARAGRAPH = re.compile(r"\n[ \t]*\n")
+_ABBREVIATIONS = frozenset(
+    "mr mrs ms dr prof sr jr st vs etc e.g i.e u.s u.k no fig al inc ltd co corp gen gov sen rep "
+    "jan feb mar apr jun jul aug sep sept oct nov dec".split()
+)
+
+
+def segment_text(raw_text: str, backend="punkt", target_tokens=128):
+    """Segment text into sentences using NLTK (or another backend, see BACKENDS)."""
+    if backend == "punkt":
+        return model_registry.get("sentence_tokenizer")(raw_text)
+    return [seg for seg, _, _ in iter_segments(raw_text, backend=backend, target_tokens=target_tokens)]
+
+
+def iter_segments(source, backend="rule", target_tokens=128, chunk_size=1 << 16):
+    """
+    Yield (segment, start, end) with character offsets into the input, where
+    source is a string or a text file object read incrementally in chunk_size pieces.
+    For punkt/rule segments, segment == source[start:end]. A window spans
+    source[start:end] but joins its sentences with single spaces, so the whitespace
+    between them (paragraph breaks included) differs from the source.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown segmentation backend: {backend}")
+    sentences = _iter_sentences(source, "punkt" if backend == "punkt" else "rule", chunk_size)
+    if backend == "window":
+        return _pack_windows(sentences, target_tokens)
+    return ((text, start, end) for text, start, end, _ in sentences)
+
+
+def _rule_spans(text):
+    """(start, end) of each sentence found by the regex splitter."""
+    spans, start = [], 0
+    for m in _BOUNDARY.finditer(text):
+        nxt = m.end()
+        if nxt < len(text) and not _SENT_START.match(text, nxt):
+            continue
+        if m.group(1) == ".":
+            word = text[text.rfind(" ", 0, m.start()) + 1:m.start()].lstrip("(\"'").lower()
+            if word in _ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+                continue  # "Dr. Smith", "J. Doe"
+        spans.append((start, m.start() + len(m.group(1)) + len(m.group(2))))
+        start = nxt
+    spans.append((start, len(text)))
+    return _trim(text, spans)
+
+
+def _punkt_spans(text):
+    """Punkt sentences located back in the text to recover offsets."""
+    spans, pos = [], 0
+    for sent in model_registry.get("sentence_tokenizer")(text):
+        start = text.find(sent, pos)
+        if start < 0:  # tokenizer normalized the text; fall back to the running position
+            start = pos
+        spans.append((start, start + len(sent)))
+        pos = start + len(sent)
+    return spans
+
+
+def _trim(text, spans):
+    out = []
+    for s, e in spans:
+        while s < e and text[s].isspace():
+            s += 1
+        while e > s and text[e - 1].isspace():
+            e -= 1
+        if e > s:
+            out.append((s, e))
+    return out
+
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_sentences(source, backend, chunk_size):
+    """Yield (sentence, start, end, paragraph_break_before) while reading incrementally."""
+    split = _punkt_spans if backend == "punkt" else _rule_spans
+    buf, base, prev = "", 0, None  # prev: end of the last emitted sentence, relative to buf
+
+    def emit(spans):
+        nonlocal prev
+        for s, e in spans:
+            gap = buf[prev:s] if prev is not None else ""
+            yield buf[s:e], base + s, base + e, bool(_PARAGRAPH.search(gap))
+            prev = e
+
+    for chunk in _iter_chunks(source, chunk_size):
+        buf += chunk
+        spans = split(buf)
+        if len(spans) <= 1:
+            if len(buf) < 8 * chunk_size:
+                continue
+            # no boundary in a long stretch: force a cut at the last whitespace before the
+            # final word (trailing whitespace would leave nothing after the cut)
+            text = buf.rstrip()
+            cut = max(text.rfind(" "), text.rfind("\n"), text.rfind("\t"))
+            if cut <= 0:
+                continue
+            spans = _trim(buf, [(0, cut), (cut, len(buf))])
+            if len(spans) < 2:
+                continue
+        # the last sentence may continue in the next chunk
+        yield from emit(spans[:-1])
+        buf, base = buf[prev:], base + prev
+        prev = 0
+    yield from emit(split(buf))
+
+
+def _pack_windows(sentences, target_tokens):
+    """Merge sentences into segments of about target_tokens; split over-long sentences.
+    Offsets span the merged sentences; the text joins them with single spaces."""
+    cur, cur_tokens, cur_start, cur_end = [], 0, None, None
+    for text, start, end, new_paragraph in sentences:
+        n = count_tokens(text)
+        if cur and (cur_tokens + n > target_tokens or (new_paragraph and cur_tokens >= target_tokens // 2)):
+            yield " ".join(cur), cur_start, cur_end
+            cur, cur_tokens = [], 0
+        if n > target_tokens:
+            # a single long sentence becomes fixed-size word windows
+            for piece, s, e in _word_windows(text, start, target_tokens):
+                yield piece, s, e
+            continue
+        if not cur:
+            cur_start = start
+        cur.append(text)
+        cur_tokens += n
+        cur_end = end
+    if cur:
+        yield " ".join(cur), cur_start, cur_end
+
 
-def segment_text(raw_text: str):
-    """Segment text into sentences using NLTK."""
-    return nltk.sent_tokenize(raw_text)
\ No newline at end of file
+def _word_windows(text, offset, size):
+    words = list(re.finditer(r"\S+", text))
+    for i in range(0, len(words), size):
+        group = words[i:i + size]
+        s, e = group[0].start(), group[-1].end()
+        yield text[s:e], offset + s, offset + e
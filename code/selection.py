@@ -1,26 +1,306 @@
 # 4. selection.py (budgeted prefill optimization)
-from utils import count_tokens
+from utils import count_tokens_batch
 import numpy as np
 
-def budgeted_selection(segments, summaries, importance_scores, B):
-    """Greedy budget allocation for full vs. summary segments."""
-    segment_costs = [count_tokens(seg) for seg in segments]
-    summary_costs = [count_tokens(s) for s in summaries]
+MODES = ("summary", "full")  # option order used by the knapsack solvers (-1 = skip)
+METHODS = ("greedy", "dp", "fptas", "lp")
 
-    utilities_full = importance_scores
-    utilities_summary = importance_scores * (np.array(summary_costs) / (np.array(segment_costs) + 1e-6))
+def _build_items(segments, summaries, importance_scores):
+    """Per-segment option values/costs: column 0 = summary, column 1 = full."""
+    return _option_arrays(count_tokens_batch(summaries), count_tokens_batch(segments), importance_scores)
 
-    items = [{"id": i, "mode": "summary", "cost": summary_costs[i], "value": utilities_summary[i]} 
-             for i in range(len(segments))]
+def _option_arrays(summary_costs, segment_costs, importance_scores):
+    return _ladder_arrays(np.column_stack([summary_costs, segment_costs]), importance_scores)
 
-    # Sort by value density
-    items = sorted(items, key=lambda x: x["value"]/max(1, x["cost"]), reverse=True)
+def _ladder_arrays(costs, importance_scores):
+    """
+    costs: (n, k) token cost per compression rung, full text in the last column.
+    A rung keeps the share of the segment's importance proportional to its length:
+    value = importance * cost / full_cost (the full text keeps all of it).
+    """
+    costs = np.asarray(costs, dtype=np.int64)
+    utilities_full = np.asarray(importance_scores, dtype=np.float64)
+    values = utilities_full[:, None] * (costs / np.maximum(costs[:, -1:], 1))
+    values[:, -1] = utilities_full
+    return values, costs
 
-    chosen, total_cost, total_value = [], 0, 0
-    for item in items:
-        if total_cost + item["cost"] <= B:
-            chosen.append(item)
-            total_cost += item["cost"]
-            total_value += item["value"]
+def budgeted_selection(segments, summaries, importance_scores, B, method="greedy", eps=0.05, return_info=False):
+    """Budget allocation for full vs. summary segments.
+    method: "greedy" (value-density over summaries only, the original heuristic),
+            or a multiple-choice knapsack solver over {skip, summary, full}:
+            "dp" (exact), "fptas" (cost-scaled DP), "lp" (LP-relaxation greedy).
+    With return_info=True also returns {"method", "bound", "gap"} where gap is the
+    relative distance to the LP upper bound (0 for "dp", which is exact)."""
+    return budgeted_selection_multi(segments, summaries, importance_scores, [B], method=method,
+                                    eps=eps, return_info=return_info)[B]
 
-    return chosen, total_cost, total_value
+def budgeted_selection_multi(segments, summaries, importance_scores, budgets, method="greedy", eps=0.05,
+                             return_info=False):
+    """budgeted_selection for several budgets at once: {B: result}.
+    Costs, values, the greedy order / LP hull and the DP table are computed once
+    and read back at every budget."""
+    values, costs = _build_items(segments, summaries, importance_scores)
+    results = {}
+    for B, (ids, modes, cost, value, info) in _select_arrays(values, costs, budgets, method, eps, return_info).items():
+        chosen = [{"id": int(i), "mode": MODES[m], "cost": int(costs[i, m]), "value": float(values[i, m])}
+                  for i, m in zip(ids.tolist(), modes.tolist())]
+        results[B] = (chosen, cost, value, info)
+
+    if return_info:
+        return results
+    return {B: res[:3] for B, res in results.items()}
+
+def select_table(table, B, method="greedy", eps=0.05, return_info=False):
+    """budgeted_selection on a SegmentTable, without building per-item dicts.
+    Stores the choice in table.mode (-1 skip / 0 summary / 1 full) and returns
+    (ids, modes, cost, value[, info]) with ids in value-density order, ready for
+    table.gather(ids, modes)."""
+    ids, modes, cost, value, info = select_table_multi(table, [B], method=method, eps=eps,
+                                                       return_info=return_info)[int(B)]
+    table.mode[:] = -1
+    table.mode[ids] = modes
+    if return_info:
+        return ids, modes, cost, value, info
+    return ids, modes, cost, value
+
+def select_table_multi(table, budgets, method="greedy", eps=0.05, return_info=False):
+    """select_table at several budgets: {B: (ids, modes, cost, value, info)}; table.mode is left untouched.
+    Modes index table.rungs, so a table built with a compression ladder lets the
+    knapsack solvers pick the best rung per segment ("greedy" uses the "summary" rung)."""
+    values, costs = _ladder_arrays(table.costs(), table.importance)
+    return _select_arrays(values, costs, budgets, method, eps, return_info, greedy_option=table.rung_index("summary"))
+
+def _select_arrays(values, costs, budgets, method, eps, return_info, greedy_option=0):
+    """{B: (ids, modes, cost, value, info)}; ids/modes are int arrays in value-density order."""
+    budgets = sorted(set(int(B) for B in budgets))
+    results = {}
+    if method == "greedy":
+        # summaries only, sorted by value density once for all budgets
+        g = greedy_option
+        order = _density_order(values[:, g], costs[:, g])
+        bounds = lp_bounds(values, costs, budgets) if return_info else {}
+        for B in budgets:
+            ids = _greedy_fill(order, costs[:, g], B)
+            modes = np.full(len(ids), g, dtype=np.int64)
+            total_cost, total_value = int(costs[ids, g].sum()), 0
+            for v in values[ids, g]:
+                total_value += v
+            info = {"method": method, "bound": None, "gap": None}
+            if return_info:
+                info["bound"] = bounds[B]
+                info["gap"] = _gap(total_value, info["bound"])
+            results[B] = (ids, modes, total_cost, total_value, info)
+    else:
+        for B, sol in solve_mckp_multi(values, costs, budgets, method=method, eps=eps).items():
+            choice = sol["choice"]
+            ids = np.flatnonzero(choice >= 0)
+            modes = choice[ids]
+            order = _density_order(values[ids, modes], costs[ids, modes])
+            info = {"method": method, "bound": sol["bound"], "gap": sol["gap"]}
+            results[B] = (ids[order], modes[order], sol["cost"], sol["value"], info)
+    return results
+
+def _density_order(values, costs):
+    """Indices by decreasing value / max(1, cost); ties keep their original order."""
+    return np.argsort(-(values / np.maximum(costs, 1)), kind="stable")
+
+def _greedy_fill(order, costs, B):
+    """Take items in `order` whenever they still fit in B."""
+    picked, total = [], 0
+    for i, c in zip(order.tolist(), costs[order].tolist()):
+        if total + c <= B:
+            picked.append(i)
+            total += c
+    return np.asarray(picked, dtype=np.int64)
+
+def _gap(value, bound):
+    if bound is None or bound <= 0:
+        return 0.0
+    return max(0.0, (bound - value) / bound)
+
+# ----------------------------
+# Multiple-choice knapsack (each group picks at most one option)
+# ----------------------------
+
+def solve_mckp(values, costs, B, method="dp", eps=0.05):
+    """
+    values, costs: (n_groups, n_options) arrays; costs are non-negative integers.
+    Returns {"choice": (n,) option index or -1, "cost", "value", "bound", "gap"}.
+    - dp:    exact O(n * k * B) dynamic program over capacity
+    - fptas: DP on costs rounded up to multiples of K = eps * B / n; always feasible
+             and at least as good as the optimum for budget (1 - eps) * B
+    - lp:    greedy on the LP relaxation (upper convex hull of each group)
+    """
+    return solve_mckp_multi(values, costs, [B], method=method, eps=eps)[int(B)]
+
+def solve_mckp_multi(values, costs, budgets, method="dp", eps=0.05):
+    """solve_mckp at several budgets: one DP table (sized for the largest budget,
+    backtracked at each capacity) or one LP hull/ordering shared by all budgets."""
+    values = np.asarray(values, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.int64)
+    budgets = sorted(set(int(B) for B in budgets))
+    n = values.shape[0]
+    if not budgets:
+        return {}
+
+    choices, bounds = {}, {}
+    if method == "dp" or (method == "fptas" and eps * budgets[0] / max(n, 1) <= 1):
+        keep = _dp_table(values, costs, max(budgets[-1], 0))[1]
+        bounds = dict.fromkeys(budgets) if method == "dp" else lp_bounds(values, costs, budgets)
+        for B in budgets:
+            choices[B] = _backtrack(keep, costs, B)
+    elif method == "fptas":
+        # K from the smallest budget keeps the (1 - eps) guarantee at every budget
+        K = eps * budgets[0] / max(n, 1)
+        scaled = np.ceil(costs / K).astype(np.int64)
+        keep = _dp_table(values, scaled, int(budgets[-1] // K))[1]
+        bounds = lp_bounds(values, costs, budgets)
+        for B in budgets:
+            choices[B] = _backtrack(keep, scaled, int(B // K))
+    elif method == "lp":
+        inc = _lp_increments(values, costs)
+        for B in budgets:
+            choices[B], bounds[B] = _lp_greedy(inc, n, B)
+    else:
+        raise ValueError(f"Unknown knapsack method: {method}")
+
+    results = {}
+    for B in budgets:
+        choice = choices[B]
+        picked = np.flatnonzero(choice >= 0)
+        value = float(values[picked, choice[picked]].sum())
+        cost = int(costs[picked, choice[picked]].sum())
+        bound = value if bounds[B] is None else bounds[B]  # dp is exact
+        results[B] = {"choice": choice, "cost": cost, "value": value, "bound": bound, "gap": _gap(value, bound)}
+    return results
+
+def _dp_table(values, costs, B):
+    """dp[c] = best value with total cost <= c; keep[i, c] = option taken by group i."""
+    n, k = values.shape
+    dp = np.zeros(B + 1)
+    keep = np.full((n, B + 1), -1, dtype=np.int8)
+    for i in range(n):
+        best = dp.copy()
+        for j in range(k):
+            c, v = costs[i, j], values[i, j]
+            if c > B or v <= 0:
+                continue
+            cand = np.full(B + 1, -np.inf)
+            cand[c:] = dp[:B + 1 - c] + v
+            better = cand > best
+            best[better] = cand[better]
+            keep[i, better] = j
+        dp = best
+    return dp, keep
+
+def _backtrack(keep, costs, cap):
+    choice = np.full(keep.shape[0], -1, dtype=np.int64)
+    if cap < 0:
+        return choice
+    for i in range(keep.shape[0] - 1, -1, -1):
+        j = keep[i, cap]
+        if j >= 0:
+            choice[i] = j
+            cap -= costs[i, j]
+    return choice
+
+def _hull_increments(values, costs):
+    """
+    Upper convex hull of {(0, 0)} + options, per group, via vectorized gift wrapping.
+    Returns increment arrays (group, from_option, to_option, dcost, dvalue, step)
+    with non-increasing efficiency dvalue/dcost inside each group.
+    """
+    n, k = values.shape
+    cur_c = np.zeros(n)
+    cur_v = np.zeros(n)
+    cur_opt = np.full(n, -1, dtype=np.int64)
+    out = {"group": [], "src": [], "dst": [], "dc": [], "dv": [], "step": []}
+    rows = np.arange(n)
+    for step in range(k):
+        dc = costs - cur_c[:, None]
+        dv = values - cur_v[:, None]
+        ok = (dv > 0) & (dc >= 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = np.where(dc > 0, dv / dc, np.inf)
+        slope = np.where(ok, slope, -np.inf)
+        best = slope.max(axis=1)
+        # collinear options (e.g. rungs of one density) each become a step: nearest first,
+        # so the LP greedy can still round to a cheaper rung when a later one does not fit
+        tol = np.where(np.isfinite(best), 1e-12 * np.abs(best), 0.0)
+        nxt = np.argmin(np.where(ok & (slope >= (best - tol)[:, None]), dc, np.inf), axis=1)
+        has = best > -np.inf
+        if not has.any():
+            break
+        g = rows[has]
+        j = nxt[has]
+        out["group"].append(g)
+        out["src"].append(cur_opt[has])
+        out["dst"].append(j)
+        out["dc"].append(dc[g, j])
+        out["dv"].append(dv[g, j])
+        out["step"].append(np.full(len(g), step))
+        cur_c[g], cur_v[g], cur_opt[g] = costs[g, j], values[g, j], j
+    if not out["group"]:
+        return {key: np.zeros(0, dtype=np.int64) for key in out}
+    return {key: np.concatenate(val) for key, val in out.items()}
+
+def _lp_order(inc):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        eff = np.where(inc["dc"] > 0, inc["dv"] / inc["dc"], np.inf)
+    # efficiencies are non-increasing along a group's hull; clamp rounding noise (collinear
+    # steps) so each group's steps stay in hull order
+    last = np.full(int(inc["group"].max()) + 1 if len(eff) else 0, np.inf)
+    for step in range(int(inc["step"].max()) + 1 if len(eff) else 0):
+        at = inc["step"] == step
+        g = inc["group"][at]
+        eff[at] = np.minimum(eff[at], last[g])
+        last[g] = eff[at]
+    # highest efficiency first; equal efficiency keeps hull order inside a group
+    return np.lexsort((inc["step"], -eff))
+
+def _lp_increments(values, costs):
+    """Hull increments of all groups in LP-greedy order (independent of the budget)."""
+    inc = _hull_increments(values, costs)
+    order = _lp_order(inc)
+    inc = {key: val[order] for key, val in inc.items()}
+    inc["used"] = np.cumsum(inc["dc"])
+    return inc
+
+def _lp_break(inc, B):
+    """Position of the first increment that no longer fits, and the LP upper bound."""
+    used = inc["used"]
+    brk = int(np.searchsorted(used, B, side="right"))
+    bound = float(inc["dv"][:brk].sum())
+    if brk < len(used):
+        room = B - (used[brk - 1] if brk > 0 else 0)
+        bound += float(room / inc["dc"][brk] * inc["dv"][brk])
+    return brk, bound
+
+def lp_bound(values, costs, B):
+    """Upper bound on the multiple-choice knapsack optimum (LP relaxation)."""
+    if values.shape[0] == 0:
+        return 0.0
+    return _lp_break(_lp_increments(values, costs), B)[1]
+
+def lp_bounds(values, costs, budgets):
+    """{B: lp_bound(values, costs, B)} from one shared hull."""
+    if values.shape[0] == 0:
+        return {B: 0.0 for B in budgets}
+    inc = _lp_increments(values, costs)
+    return {B: _lp_break(inc, B)[1] for B in budgets}
+
+def _lp_greedy(inc, n, B):
+    choice = np.full(n, -1, dtype=np.int64)
+    if n == 0:
+        return choice, 0.0
+    brk, bound = _lp_break(inc, B)
+    # integral prefix of the LP solution
+    for g, dst in zip(inc["group"][:brk], inc["dst"][:brk]):
+        choice[g] = dst  # increments of a group arrive in hull order
+    spent = int(inc["dc"][:brk].sum())
+    # fill leftover capacity with increments that still extend their group's choice
+    for g, src, dst, dc in zip(inc["group"][brk:], inc["src"][brk:], inc["dst"][brk:], inc["dc"][brk:]):
+        if choice[g] == src and spent + dc <= B:
+            choice[g] = dst
+            spent += int(dc)
+    return choice, bound
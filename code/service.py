@@ -0,0 +1,411 @@
+# service.py
+# Long-running budgeted prefill service.
+# Models are loaded once; (document, query, budget) requests arrive as JSON over local
+# HTTP or a Unix socket and get back the selected prompt with its cost and value.
+# Concurrent requests are micro-batched: embedding and summarization calls from all
+# in-flight requests are merged into shared model calls (one model thread), while the
+# rest of each request (segmentation, BM25, selection) runs in a worker thread pool.
+#
+#   python service.py --port 8080            # POST /prefill, GET /health
+#   python service.py --unix /tmp/bpo.sock --stubs
+#
+#   curl -s localhost:8080/prefill -d '{"document": "...", "query": "...", "budget": 512}'
+#
+# With "floor" in the request, "budget" is a ceiling and budget_controller picks the
+# per-request budget in [floor, budget]; the response reports the budget it chose.
+# Prompts are assembled in --prompt-order (assembly.py); with --simulate-prefix-cache every
+# prompt also goes through a simulated KV prefix cache whose hit rate /health reports.
+# "selected" lists [segment id, rung] with ids into the document's segments, also with
+# --dedup (a kept segment is reported as the first of its near-duplicate group).
+
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import model_registry
+from assembly import ORDERS, CoreTracker, PrefixCacheSimulator, order_selection
+from budget_controller import choose_budget
+from dedup import dedup_segments
+from instrument import span
+from lazy_selection import LazyLadder, lazy_select
+from scoring import LADDER, compute_importance, summarize_ladder
+from segment_table import SegmentTable
+from segmentation import segment_text
+from selection import METHODS, select_table_multi
+from utils import content_hash, get_token_counter
+
+MAX_BODY_BYTES = 64 << 20
+
+
+class BadRequest(ValueError):
+    """A request the service rejects as invalid (HTTP 400)."""
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent submit() calls into batched fn(items, key) calls.
+    A batch closes after max_delay seconds or once max_batch_size items are queued;
+    submissions with different keys (e.g. summary lengths) go to separate calls.
+    fn runs on `executor` and must return a sequence aligned with `items`.
+    """
+
+    def __init__(self, fn, max_batch_size=64, max_delay=0.005, executor=None):
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.executor = executor
+        self.calls = 0
+        self._queue = None
+        self._task = None
+
+    async def submit(self, items, key=None):
+        loop = asyncio.get_running_loop()
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._run())
+        fut = loop.create_future()
+        await self._queue.put((key, list(items), fut))
+        return await fut
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][1])
+            deadline = loop.time() + self.max_delay
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                size += len(batch[-1][1])
+
+            groups = {}
+            for key, items, fut in batch:
+                groups.setdefault(key, []).append((items, fut))
+            for key, entries in groups.items():
+                await self._call(loop, key, entries)
+
+    async def _call(self, loop, key, entries):
+        flat = [item for items, _ in entries for item in items]
+        try:
+            with span("service_batch", n=len(flat), requests=len(entries)):
+                out = await loop.run_in_executor(self.executor, self.fn, flat, key)
+            self.calls += 1
+        except Exception as e:
+            for _, fut in entries:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        start = 0
+        for items, fut in entries:
+            if not fut.done():
+                fut.set_result(out[start:start + len(items)])
+            start += len(items)
+
+
+class PrefillService:
+    """
+    Request handling independent of the transport: `await service.prefill(...)`
+    is what the HTTP handler calls, and can be used directly in-process.
+    """
+
+    def __init__(self, method="lazy", summary_batch_size=8, max_batch_size=64, max_delay=0.005,
+                 workers=16, segmenter="punkt", ladder=LADDER, dedup=False, prompt_order="selection",
+                 simulate_prefix_cache=False):
+        self.method = method  # "lazy" (lazy_selection.py) or a selection.select_table method
+        self.summary_batch_size = summary_batch_size
+        self.segmenter = segmenter
+        self.ladder = ladder
+        self.dedup = dedup  # collapse near-duplicate segments (dedup.py) before scoring
+        self.prompt_order = prompt_order  # assembly.ORDERS
+        self.core_tracker = CoreTracker()
+        self.prefix_cache = PrefixCacheSimulator() if simulate_prefix_cache else None
+        self.stats = {"requests": 0, "errors": 0, "seconds": 0.0}
+        # one thread owns the models; request work runs on the pool
+        self._model_thread = ThreadPoolExecutor(1, thread_name_prefix="bpo-model")
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="bpo-request")
+        self.embed_batcher = MicroBatcher(self._embed, max_batch_size, max_delay, self._model_thread)
+        self.summary_batcher = MicroBatcher(self._summarize, max_batch_size, max_delay, self._model_thread)
+        self._loop = None
+
+    async def start(self, load=True):
+        """Bind to the running loop; with load=True build every model up front."""
+        self._loop = asyncio.get_running_loop()
+        if load:
+            await self._loop.run_in_executor(self._model_thread, load_models)
+
+    async def close(self):
+        await self.embed_batcher.close()
+        await self.summary_batcher.close()
+        self._pool.shutdown(wait=False)
+        self._model_thread.shutdown(wait=False)
+
+    # ---- model calls (model thread) ----
+
+    def _embed(self, texts, key):
+        return model_registry.get("embedder").encode(texts)
+
+    def _summarize(self, texts, key):
+        max_length, min_length = key
+        return model_registry.get("summarizer")(texts, max_length=max_length, min_length=min_length,
+                                                do_sample=False, batch_size=self.summary_batch_size)
+
+    # ---- batched front-ends, called from request threads ----
+
+    def encode(self, texts):
+        return asyncio.run_coroutine_threadsafe(self.embed_batcher.submit(texts), self._loop).result()
+
+    def summarize(self, texts, max_length=50, min_length=10, **kwargs):
+        texts = [texts] if isinstance(texts, str) else texts
+        key = (max_length, min_length)
+        return asyncio.run_coroutine_threadsafe(self.summary_batcher.submit(texts, key), self._loop).result()
+
+    # ---- requests ----
+
+    async def prefill(self, document, query, budget, method=None, floor=None):
+        method = method or self.method
+        if method != "lazy" and method not in METHODS:
+            raise BadRequest(f"unknown method {method!r} (expected lazy or one of {METHODS})")
+        if not isinstance(document, str) or not isinstance(query, str):
+            raise BadRequest("document and query must be strings")
+        if self._loop is None:
+            await self.start(load=False)
+        start = time.perf_counter()
+        try:
+            return await self._loop.run_in_executor(self._pool, self._prefill, document, query,
+                                                    int(budget), method,
+                                                    None if floor is None else int(floor))
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.stats["requests"] += 1
+            self.stats["seconds"] += time.perf_counter() - start
+
+    def _prefill(self, document, query, budget, method, floor=None):
+        with span("service_request", budget=budget):
+            segments = segment_text(document, backend=self.segmenter) if document.strip() else []
+            if not segments:
+                return _empty_response(budget, method)
+            n_segments = len(segments)
+            dedup = dedup_segments(segments) if self.dedup else None
+            if dedup is not None:
+                segments = dedup.segments
+            importance = compute_importance(segments, query, encode=self.encode)
+            rung_names = [name for name, _ in self.ladder] + ["full"]
+            summarized = 0
+
+            def summarize(texts, **kwargs):
+                # only cache misses reach the summarizer; count those
+                nonlocal summarized
+                texts = [texts] if isinstance(texts, str) else texts
+                summarized += len(texts)
+                return self.summarize(texts, **kwargs)
+
+            if method == "lazy":
+                # summaries only for segments that can still enter the selection
+                ladder = LazyLadder(segments, self.ladder, batch_size=self.summary_batch_size,
+                                    summarize=summarize)
+                select_multi = lambda budgets: lazy_select(ladder, importance, budgets, return_info=True)
+                gather, tokens_before = ladder.gather, int(ladder.costs[:, -1].sum())
+            else:
+                rungs = summarize_ladder(segments, self.ladder, batch_size=self.summary_batch_size,
+                                         summarize=summarize)
+                table = SegmentTable.from_rungs(rungs + [segments], rung_names, importance)
+                select_multi = lambda budgets: select_table_multi(table, budgets, method=method, return_info=True)
+                gather, tokens_before = table.gather, int(table.seg_costs.sum())
+            ceiling, adaptive = budget, None
+            if floor is None:
+                ids, modes, cost, value, info = select_multi([budget])[budget]
+            else:
+                budget, (ids, modes, cost, value, info), adaptive = choose_budget(select_multi, importance,
+                                                                                  floor=floor, ceiling=ceiling)
+            doc_key = content_hash(document)
+            ids, modes = order_selection(ids, modes, self.prompt_order, self.core_tracker.core(doc_key))
+            self.core_tracker.observe(doc_key, ids, modes)
+            prompt = gather(ids, modes)
+            original = dedup.keep[np.asarray(ids, dtype=np.int64)] if dedup is not None else ids
+            cached = None
+            if self.prefix_cache is not None:
+                cached = self.prefix_cache.process(get_token_counter().encode([prompt])[0])
+            response = {
+                "prompt": prompt,
+                "cost": int(cost),
+                "value": float(value),
+                "budget": budget,
+                "method": method,
+                "gap": info["gap"],
+                "n_segments": n_segments,
+                "n_unique": len(segments),
+                "tokens_before": tokens_before,
+                "summarized": summarized,
+                "prefix_cached": cached,
+                "selected": [[int(i), rung_names[m]] for i, m in zip(original.tolist(), modes.tolist())],
+            }
+            if adaptive is not None:
+                response.update(ceiling=ceiling, floor=floor, budget_reason=adaptive["reason"],
+                                coverage=adaptive["coverage"])
+            return response
+
+
+def _empty_response(budget, method):
+    """Response for a document without any segment (empty or whitespace only)."""
+    return {"prompt": "", "cost": 0, "value": 0.0, "budget": budget, "method": method, "gap": None,
+            "n_segments": 0, "n_unique": 0, "tokens_before": 0, "summarized": 0, "prefix_cached": None,
+            "selected": []}
+
+
+def load_models():
+    """Load every model the service calls (no-op for overridden stand-ins)."""
+    model_registry.get("embedder")
+    model_registry.get("summarizer")
+    model_registry.get("word_tokenizer")
+
+
+# ----------------------------
+# HTTP/1.1 transport (stdlib only; keep-alive, JSON bodies)
+# ----------------------------
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+async def _handle(service, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                http_method, path, _ = request_line.decode("latin-1").split(" ", 2)
+            except ValueError:
+                await _respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, val = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = val.strip()
+            length = int(headers.get("content-length", "0") or 0)
+            if length > MAX_BODY_BYTES:
+                await _respond(writer, 413, {"error": "body too large"}, keep_alive=False)
+                break
+            body = await reader.readexactly(length) if length else b""
+            keep_alive = headers.get("connection", "").lower() != "close"
+            status, payload = await _route(service, http_method, path.split("?", 1)[0], body)
+            await _respond(writer, status, payload, keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _route(service, http_method, path, body):
+    if path == "/health":
+        return 200, dict(service.stats, status="ok",
+                         embed_calls=service.embed_batcher.calls, summary_calls=service.summary_batcher.calls,
+                         prefix_cache=service.prefix_cache and service.prefix_cache.stats())
+    if path != "/prefill":
+        return 404, {"error": f"unknown path {path}"}
+    if http_method != "POST":
+        return 405, {"error": "use POST"}
+    try:
+        req = json.loads(body or b"{}")
+        document, query, budget = req["document"], req["query"], int(req["budget"])
+        floor = None if req.get("floor") is None else int(req["floor"])
+    except (ValueError, KeyError, TypeError) as e:
+        return 400, {"error": f"expected JSON with document, query, budget ({e})"}
+    try:
+        return 200, await service.prefill(document, query, budget, method=req.get("method"), floor=floor)
+    except BadRequest as e:
+        return 400, {"error": str(e)}
+    except Exception as e:
+        return 500, {"error": f"{type(e).__name__}: {e}"}
+
+
+async def _respond(writer, status, payload, keep_alive=True):
+    body = json.dumps(payload).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+
+
+async def serve(service, host="127.0.0.1", port=8080, unix_path=None, load=True):
+    """Start the service; returns the asyncio server (use `async with` / serve_forever)."""
+    await service.start(load=load)
+
+    def handler(reader, writer):
+        return _handle(service, reader, writer)
+
+    if unix_path:
+        return await asyncio.start_unix_server(handler, path=unix_path)
+    return await asyncio.start_server(handler, host=host, port=port)
+
+
+async def _main(args):
+    if args.stubs:
+        from stubs import install_stubs
+        install_stubs()
+    if args.tokenizer:
+        from utils import TokenCounter, set_token_counter
+        set_token_counter(TokenCounter.from_pretrained(args.tokenizer))
+    service = PrefillService(method=args.method, max_batch_size=args.max_batch_size,
+                             max_delay=args.max_delay_ms / 1000, workers=args.workers,
+                             segmenter=args.segmenter, dedup=args.dedup, prompt_order=args.prompt_order,
+                             simulate_prefix_cache=args.simulate_prefix_cache)
+    server = await serve(service, args.host, args.port, args.unix)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"[INFO] BPO prefill service listening on {where}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Budgeted prefill service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", default=None, help="serve on this Unix socket path instead of TCP")
+    parser.add_argument("--method", default="lazy",
+                        help="lazy (importance-gated summaries) or a knapsack solver (see selection.budgeted_selection)")
+    parser.add_argument("--segmenter", default="punkt", help="segmentation backend (see segmentation.BACKENDS)")
+    parser.add_argument("--prompt-order", default="selection", choices=ORDERS,
+                        help="order of the selected segments in the prompt (see assembly.py)")
+    parser.add_argument("--simulate-prefix-cache", action="store_true",
+                        help="replay prompts through a local KV prefix-cache simulator (stats in /health)")
+    parser.add_argument("--dedup", action="store_true", help="collapse near-duplicate segments before scoring")
+    parser.add_argument("--tokenizer", default=None, help="count budgets in this model's tokens")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-delay-ms", type=float, default=5.0)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--stubs", action="store_true", help="use local stand-in models (stubs.py)")
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,71 @@
+# stubs.py
+# Lightweight local stand-ins for the model-backed stages (benchmarks, local service runs).
+# install_stubs() puts them in model_registry, so no model download or network is needed;
+# `with stubbed_models():` does so only for the duration of the block.
+
+import re
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+import model_registry
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+_SENT = re.compile(r"(?<=[.!?])\s+")
+
+
+class StubEmbedder:
+    """Hashed bag-of-words vectors: deterministic, cheap, and similar texts score similarly."""
+    name = "stub-embedder"
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, texts, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                h = zlib.crc32(word.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return out[0] if single else out
+
+
+class StubSummarizer:
+    """Extractive 'summary': the leading words, sized like the requested max/min length."""
+    name = "stub-summarizer"
+
+    def __call__(self, inputs, max_length=50, min_length=10, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        keep = max(1, int(0.75 * max_length))
+        out = [{"summary_text": " ".join(t.split()[:keep])} for t in texts]
+        return out
+
+
+def word_tokenize(text):
+    return _WORD.findall(text)
+
+
+def sent_tokenize(text):
+    return [s for s in _SENT.split(text.strip()) if s]
+
+
+def install_stubs():
+    """Route embedder / summarizer / tokenizers through the stand-ins above."""
+    model_registry.override("embedder", StubEmbedder())
+    model_registry.override("summarizer", StubSummarizer())
+    model_registry.override("word_tokenizer", word_tokenize)
+    model_registry.override("sentence_tokenizer", sent_tokenize)
+
+
+@contextmanager
+def stubbed_models():
+    """install_stubs() for the block; the previous registry state is restored afterwards."""
+    state = model_registry.snapshot()
+    install_stubs()
+    try:
+        yield
+    finally:
+        model_registry.restore(state)
@@ -0,0 +1,137 @@
+# summary_cache.py
+# Content-addressed cache for segment summaries (in-memory LRU in front of an on-disk store).
+
+import os
+import threading
+from collections import OrderedDict
+
+from utils import content_hash
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "BPO_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "bpo")
+)
+
+
+def summary_key(text, model, max_length, min_length):
+    """Cache key: segment text hash + summarizer model + length parameters."""
+    return content_hash("summary", model, max_length, min_length, text)
+
+
+class SummaryCache:
+    """
+    Two-level summary cache.
+    - memory: OrderedDict LRU holding at most `max_memory_items` entries
+    - disk: one small file per key under `cache_dir/summaries`, evicted
+      oldest-first (by mtime, refreshed on hit) once `max_disk_bytes` is exceeded
+    Safe to share between threads; separate processes share the disk level.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_items=20000,
+                 max_disk_bytes=512 * 1024 * 1024):
+        self.root = os.path.join(cache_dir, "summaries") if cache_dir else None
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # computed lazily on first write
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".txt")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                self.hits += 1
+                return self._mem[key]
+        value = None
+        if self.root:
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = f.read()
+                os.utime(path, None)
+            except OSError:
+                value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if not self.root:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(value)
+            try:
+                old_size = os.path.getsize(path)  # overwriting a key replaces its bytes
+            except OSError:
+                old_size = 0
+            os.replace(tmp, path)
+        except OSError:
+            return  # disk cache is best-effort
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_size()
+            else:
+                self._disk_bytes += len(value.encode("utf-8")) - old_size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            for path, _, _ in self._entries():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+
+    def _remember(self, key, value):
+        self._mem[key] = value
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_memory_items:
+            self._mem.popitem(last=False)
+
+    def _entries(self):
+        if not self.root or not os.path.isdir(self.root):
+            return []
+        entries = []
+        for sub in os.scandir(self.root):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                if e.name.endswith(".txt"):
+                    st = e.stat()
+                    entries.append((e.path, st.st_mtime, st.st_size))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, _, size in self._entries())
+
+    def _evict(self):
+        """Drop oldest files until the store is back under 90% of its budget."""
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        target = int(0.9 * self.max_disk_bytes)
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
@@ -1,9 +1,129 @@
 # 1. utils.py (basic helpers)
+import os
 import time
-import nltk
+import hashlib
+import threading
+
+class TokenCounter:
+    """
+    Token counter used for all budgets.
+    tokenizer=None counts whitespace words (the original behaviour); otherwise a
+    HuggingFace tokenizer (e.g. the one returned by models.load_model) counts real
+    prefill tokens. Counts are memoized by a 16-byte text digest (the texts themselves are
+    not kept), count_batch tokenizes all uncached texts in a single tokenizer call, and
+    the memo is safe to share between threads.
+    """
+
+    def __init__(self, tokenizer=None, max_cache_items=200000):
+        self.tokenizer = tokenizer
+        self.max_cache_items = max_cache_items
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_pretrained(cls, name_or_path, **kwargs):
+        """Load a tokenizer by model name, local directory or tokenizer.json file."""
+        if name_or_path.endswith(".json") and os.path.isfile(name_or_path):
+            from transformers import PreTrainedTokenizerFast
+            tokenizer = PreTrainedTokenizerFast(tokenizer_file=name_or_path)
+        else:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(name_or_path)
+        return cls(tokenizer, **kwargs)
+
+    @property
+    def name(self):
+        """Identifier of the counting scheme (cache keys, artifact manifests)."""
+        if self.tokenizer is None:
+            return "whitespace"
+        return getattr(self.tokenizer, "name_or_path", None) or type(self.tokenizer).__name__
+
+    def encode(self, texts):
+        """Token sequences (ids, or words for the whitespace counter) for each text."""
+        if self.tokenizer is None:
+            return [t.split() for t in texts]
+        return self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+
+    def count_batch(self, texts):
+        keys = [_text_key(t) for t in texts]
+        with self._lock:
+            found = {k: self._cache[k] for k in keys if k in self._cache}
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            if self.tokenizer is None:
+                counts = [len(t.split()) for t in missing.values()]
+            else:
+                counts = [len(ids) for ids in self.encode(list(missing.values()))]
+            new = list(zip(missing, counts))
+            found.update(new)
+            new = new[-self.max_cache_items:] if self.max_cache_items > 0 else []
+            with self._lock:
+                if len(self._cache) + len(new) > self.max_cache_items:
+                    self._cache.clear()
+                self._cache.update(new)
+        return [found[k] for k in keys]
+
+    def truncate(self, text: str, n: int):
+        """First n tokens of text, and how many tokens were kept."""
+        if self.tokenizer is None:
+            words = text.split()[:n]
+            return " ".join(words), len(words)
+        ids = self.encode([text])[0][:n]
+        return self.tokenizer.decode(ids, skip_special_tokens=True), len(ids)
+
+
+def _text_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+_token_counter = TokenCounter()
+
+def set_token_counter(counter):
+    """Install the counter used by count_tokens (e.g. TokenCounter(tokenizer))."""
+    global _token_counter
+    _token_counter = counter
+
+def get_token_counter():
+    return _token_counter
 
 def count_tokens(text: str) -> int:
-    return len(text.split())
+    return _token_counter.count(text)
+
+def count_tokens_batch(texts):
+    return _token_counter.count_batch(texts)
+
+def truncate_tokens(text: str, n: int):
+    return _token_counter.truncate(text, n)
+
+def content_hash(*parts) -> str:
+    """Stable hex digest over one or more strings (used as cache keys)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+_nltk_lock = threading.Lock()
+_nltk_ready = False
+
+def ensure_nltk_data(packages=("punkt", "punkt_tab")):
+    """Make sure the NLTK tokenizer data exists; downloads only if missing, on first use."""
+    global _nltk_ready
+    if _nltk_ready:
+        return
+    with _nltk_lock:
+        if _nltk_ready:
+            return
+        import nltk
+        for pkg in packages:
+            try:
+                nltk.data.find(f"tokenizers/{pkg}")
+            except LookupError:
+                nltk.download(pkg, quiet=True)
+        _nltk_ready = True
 
 def load_text(file_path: str) -> str:
     with open(file_path, "r", encoding="utf-8") as f:
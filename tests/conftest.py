@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# the modules are flat files in code/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+# keep the summary / index caches of the test run out of ~/.cache
+os.environ.setdefault("BPO_CACHE_DIR", tempfile.mkdtemp(prefix="bpo-test-cache-"))
+
+
+@pytest.fixture
+def stub_models():
+    """Local stand-in models (stubs.py) for the duration of a test."""
+    from stubs import stubbed_models
+    with stubbed_models():
+        yield
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import run_experiment
+from assembly import CoreTracker, PrefixCacheSimulator, order_selection
+
+
+def _pairs(ids, modes):
+    return list(zip(ids.tolist(), modes.tolist()))
+
+
+def test_order_modes():
+    ids, modes = [7, 2, 9, 4], [1, 0, 1, 0]
+    assert _pairs(*order_selection(ids, modes, "selection")) == [(7, 1), (2, 0), (9, 1), (4, 0)]
+    assert _pairs(*order_selection(ids, modes, "document")) == [(2, 0), (4, 0), (7, 1), (9, 1)]
+    core = {(9, 1), (4, 0), (7, 0)}  # (7, 0) is another rung of a selected segment: not pinned
+    assert _pairs(*order_selection(ids, modes, "core", core)) == [(4, 0), (9, 1), (2, 0), (7, 1)]
+    assert _pairs(*order_selection(ids, modes, "core")) == [(2, 0), (4, 0), (7, 1), (9, 1)]
+    assert _pairs(*order_selection([], [], "document")) == []
+    with pytest.raises(ValueError):
+        order_selection(ids, modes, "random")
+
+
+def test_core_tracker():
+    tracker = CoreTracker(window=3, min_share=0.5, max_documents=2)
+    for selection in ([1, 2, 3], [1, 2], [1, 4], [1, 5]):  # the window keeps the last three
+        tracker.observe("doc", selection, [0] * len(selection))
+    assert tracker.core("doc") == {(1, 0)}
+    tracker.observe("other", [8], [1])
+    assert tracker.core("other") == {(8, 1)}
+    tracker.observe("third", [9], [1])  # "doc" is the least recently used document
+    assert tracker.core("doc") == set() and tracker.core("third") == {(9, 1)}
+
+
+def test_prefix_cache_hit_accounting():
+    sim = PrefixCacheSimulator(block_size=4, capacity=3)
+    prompt = list(range(10))  # two whole blocks + a partial one
+    assert sim.process(prompt) == 0
+    assert sim.process(prompt) == 8  # whole blocks only
+    assert sim.process(list(range(6)) + [99, 98, 97, 96]) == 4  # shares the first block only
+    assert sim.process([5] + prompt) == 0  # a shifted prompt shares no block
+    assert sim.process(prompt) == 0  # its blocks were evicted (capacity 3)
+    stats = sim.stats()
+    assert stats["requests"] == 5 and stats["tokens"] == 51 and stats["saved_tokens"] == 12
+    assert stats["prefill_tokens"] == 39 and stats["hit_rate"] == pytest.approx(12 / 51)
+
+
+def test_document_order_raises_the_hit_rate():
+    rng = np.random.default_rng(0)
+    segments = [[1000 * i + j for j in range(16)] for i in range(40)]  # 16-token segments
+    selections = [rng.permutation(np.r_[np.arange(10), rng.choice(np.arange(10, 40), 6, replace=False)])
+                  for _ in range(30)]  # queries share ten segments, in query-dependent order
+    rates = {}
+    for order in ("selection", "document"):
+        sim = PrefixCacheSimulator(block_size=16)
+        for ids in selections:
+            ordered, _ = order_selection(ids, np.ones(len(ids), dtype=int), order)
+            sim.process([t for i in ordered for t in segments[i]])
+        rates[order] = sim.stats()["hit_rate"]
+    assert rates["document"] > 0.5 > rates["selection"]
+
+
+class _Source:
+    def gather(self, ids, modes):
+        return " ".join(f"{i}:{m}" for i, m in zip(ids, modes))
+
+
+def test_experiment_core_order(monkeypatch):
+    monkeypatch.setattr(run_experiment, "PROMPT_ORDER", "core")
+    monkeypatch.setattr(run_experiment, "_core_tracker", CoreTracker())
+    source = _Source()
+    assert run_experiment._assemble(source, [5, 3], [1, 1], "doc") == "3:1 5:1"
+    assert run_experiment._assemble(source, [9, 5, 1], [1, 1, 0], "doc") == "5:1 1:0 9:1"
+    assert run_experiment._assemble(source, [9, 5, 1], [1, 1, 0], "new") == "1:0 5:1 9:1"
@@ -0,0 +1,28 @@
+import numpy as np
+
+from budget_controller import choose_budget, choose_budgets
+
+
+def _solver(curve, calls):
+    def select_multi(budgets):
+        calls.append(list(budgets))
+        return {B: (np.arange(3), np.zeros(3, dtype=int), B, curve(B)) for B in budgets}
+    return select_multi
+
+
+def test_one_solve_for_all_ceilings():
+    calls = []
+    chosen = choose_budgets(_solver(lambda B: float(B), calls), np.ones(10) * 1e6, [4000, 1000, 8000], floor=500)
+    assert len(calls) == 1 and max(calls[0]) == 8000
+    assert sorted(chosen) == [1000, 4000, 8000]
+    for ceiling, (budget, _, report) in chosen.items():
+        assert budget == ceiling and report["reason"] == "ceiling"  # linear value: never flat
+        assert report["grid"][-1][0] == ceiling
+    assert choose_budgets(_solver(float, calls), np.ones(3), []) == {}
+
+
+def test_flat_is_marginal_slope():
+    # saturates at 2000 tokens; a distance-to-ceiling test would stop much later or never
+    curve = lambda B: float(min(B, 2000) + 0.001 * B)
+    budget, _, report = choose_budget(_solver(curve, []), np.ones(10) * 1e6, floor=500, ceiling=8000, n_steps=9)
+    assert report["reason"] == "flat" and budget == 2000  # grid 500, 707, 1000, 1414, 2000, ...
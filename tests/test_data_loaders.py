@@ -0,0 +1,44 @@
+import os
+import socket
+
+import pytest
+
+pytest.importorskip("datasets")
+
+import data_loaders  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    """Any network access fails the test; the datasets cache goes to a temp dir."""
+    def refuse(*args, **kwargs):
+        raise AssertionError("network access while loading a local split")
+    monkeypatch.setattr(socket.socket, "connect", refuse)
+    monkeypatch.setattr(socket, "create_connection", refuse)
+    monkeypatch.setenv("HF_DATASETS_OFFLINE", "1")
+    monkeypatch.setenv("HF_DATASETS_CACHE", str(tmp_path))
+
+
+def test_qa_datasets_from_local_dir():
+    (first, second) = data_loaders.iter_hotpotqa(local_dir=FIXTURES)
+    assert first == {"id": "hp1", "query": "Which river flows through Paris?",
+                     "context": "Paris is the capital of France. The Seine flows through it. Lyon lies on the Rhone.",
+                     "answer": "the Seine"}
+    assert second["id"] == "hp2"
+    assert list(data_loaders.iter_hotpotqa(n=1, local_dir=FIXTURES)) == [first]
+    (trivia,) = data_loaders.iter_triviaqa(local_dir=FIXTURES)
+    assert trivia == {"id": "tq1", "query": "What is the largest planet?",
+                      "context": "Jupiter is the largest planet. It has many moons.", "answer": "Jupiter"}
+
+
+def test_summarization_datasets_from_local_dir():
+    reports = list(data_loaders.iter_govreport(local_dir=FIXTURES))
+    assert [r["summary"] for r in reports] == ["Spending rose.", "Three audits."]
+    assert len({r["id"] for r in reports}) == 2
+    shard = list(data_loaders.iter_govreport(local_dir=FIXTURES, num_shards=2, shard_index=1))
+    assert shard == reports[1:]
+    (paper,) = data_loaders.iter_arxiv(local_dir=FIXTURES)
+    assert paper["report"] == "We study budgeted prefill. Results improve."
+    assert paper["summary"] == "Budgeted prefill helps."
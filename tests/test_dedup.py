@@ -0,0 +1,16 @@
+from dedup import dedup_segments, minhash_signatures, shingles
+
+
+def test_wordless_segments_stay_apart():
+    segments = ["---", "The river floods every spring.", "***", "...", "The river floods every spring."]
+    assert shingles("--- !") == set()
+    result = dedup_segments(segments)
+    assert result.keep.tolist() == [0, 1, 2, 3]
+    assert result.mapping.tolist() == [0, 1, 2, 3, 1]
+
+
+def test_signatures_do_not_depend_on_neighbours():
+    texts = ["alpha beta gamma delta", "", "gamma delta epsilon zeta eta"]
+    alone = minhash_signatures([texts[0], texts[2]])
+    together = minhash_signatures(texts)
+    assert (together[[0, 2]] == alone).all()
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from lazy_selection import LazyLadder, lazy_select
+from selection import _ladder_arrays, lp_bound, solve_mckp
+
+LADDER = (("summary", (50, 10)),)
+
+
+class _OneWordSummarizer:
+    """Records every segment it is asked to summarize; each summary costs one token."""
+
+    def __init__(self):
+        self.seen = []
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        self.seen.extend(texts)
+        return [{"summary_text": t.split()[0]} for t in texts]
+
+
+def _document(n=30, seed=0):
+    rng = np.random.default_rng(seed)
+    segments = [" ".join(f"w{i}x{j}" for j in range(int(rng.integers(20, 120)))) for i in range(n)]
+    importance = rng.random(n)
+    importance[rng.choice(n, 5, replace=False)] = 0.0
+    return segments, importance
+
+
+def _ladder(segments, batch_size, summarize):
+    return LazyLadder(segments, LADDER, batch_size=batch_size, cache=None, summarize=summarize)
+
+
+@pytest.mark.parametrize("batch_size", [None, 1, 4])
+def test_lazy_matches_eager_rungs(batch_size):
+    segments, importance = _document()
+    budgets = [150, 400, 900]
+    lazy = _ladder(segments, batch_size, _OneWordSummarizer())
+    eager = _ladder(segments, batch_size, _OneWordSummarizer())
+    eager.materialize(range(len(segments)))
+    lazy_res = lazy_select(lazy, importance, budgets)
+    eager_res = lazy_select(eager, importance, budgets)
+    values, costs = _ladder_arrays(eager.costs, importance)
+    for B in budgets:
+        ids, modes, cost, value = lazy_res[B]
+        np.testing.assert_array_equal(ids, eager_res[B][0])
+        np.testing.assert_array_equal(modes, eager_res[B][1])
+        assert len(set(ids.tolist())) == len(ids) and cost == costs[ids, modes].sum() <= B
+        assert value == pytest.approx(values[ids, modes].sum())
+        assert value <= solve_mckp(values, costs, B, method="dp")["value"] + 1e-9
+        # a density greedy loses at most one item against the fractional bound on full texts
+        assert value >= lp_bound(importance[:, None], costs[:, -1:], B) - importance.max() - 1e-9
+    assert lazy.summarized < len(segments)
+
+
+def test_only_chosen_segments_are_summarized():
+    segments, importance = _document()
+    summarizer = _OneWordSummarizer()
+    ladder = _ladder(segments, None, summarizer)
+    ids, modes, _, _ = lazy_select(ladder, importance, [300])[300]
+    summarized = {segments.index(t) for t in summarizer.seen}
+    assert summarized == set(ids[modes == 0].tolist())
+    assert not summarized & set(np.flatnonzero(importance == 0).tolist())
+    assert ladder.fill_in_order("summary", 5) == (" ".join(s.split()[0] for s in segments[:5]), 5)
@@ -0,0 +1,54 @@
+from models import run_llm_batch
+
+
+class _Encoding(dict):
+    def to(self, device):
+        return self
+
+
+class _Tokenizer:
+    """Whitespace tokenizer; ids are words, padding is recorded so the test can inspect it."""
+
+    pad_token = None
+    eos_token = "<eos>"
+    pad_token_id = 0
+    padding_side = "right"
+
+    def __init__(self):
+        self.padded = []
+
+    def __call__(self, texts, return_tensors=None, padding=False):
+        ids = [t.split() for t in texts]
+        if padding:
+            width = max(len(x) for x in ids)
+            pad = [[self.pad_token] * (width - len(x)) for x in ids]
+            ids = [p + x if self.padding_side == "left" else x + p for p, x in zip(pad, ids)]
+            self.padded.append(ids)
+        return _Encoding(input_ids=ids)
+
+    def decode(self, seq, skip_special_tokens=False):
+        return " ".join(w for w in seq if not (skip_special_tokens and w == self.pad_token))
+
+
+class _Model:
+    device = "cpu"
+
+    def __init__(self):
+        self.batches = []
+
+    def generate(self, input_ids, max_new_tokens, pad_token_id):
+        self.batches.append([len([w for w in x if w != "<eos>"]) for x in input_ids])
+        return [x + ["out"] for x in input_ids]
+
+
+def test_batched_generation():
+    prompts = [" ".join(f"p{i}" for _ in range(n)) for i, n in enumerate([5, 1, 3, 4, 2, 6, 1])]
+    tokenizer, model = _Tokenizer(), _Model()
+    outputs = run_llm_batch(model, tokenizer, prompts, batch_size=3)
+    assert outputs == [p + " out" for p in prompts]
+    assert [len(b) for b in model.batches] == [3, 3, 1]
+    lengths = [n for b in model.batches for n in b]
+    assert lengths == sorted(lengths)  # buckets hold prompts of similar length
+    for ids in tokenizer.padded:
+        assert all(x[-1] != "<eos>" for x in ids)  # left padding: prompts end the row
+    assert tokenizer.padding_side == "right" and tokenizer.pad_token == "<eos>"
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from instrument import count, example, span, tracer
+from parallel import map_examples
+
+
+def _work(x):
+    with example(f"ex{x}"):
+        with span("square"):
+            count("items", 1)
+            return x * x
+
+
+@pytest.fixture
+def traced():
+    enabled = tracer.enabled
+    tracer.enabled = True
+    tracer.reset()
+    yield tracer
+    tracer.enabled = enabled
+    tracer.reset()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_worker_traces_are_merged(traced, workers, tmp_path):
+    assert list(map_examples(_work, range(6), workers=workers)) == [x * x for x in range(6)]
+    squares = [e for e in traced.events if e[0] == "square"]
+    assert sorted(e[3] for e in squares) == [f"ex{x}" for x in range(6)]
+    assert len(traced.counters) == 6
+    if workers > 1:
+        assert all(e[6] != os.getpid() for e in squares)
+    assert traced.summary()["per_example"]["square"]["count"] == 6
+    traced.export_jsonl(str(tmp_path / "trace.jsonl"))
+    traced.export_chrome_trace(str(tmp_path / "trace.json"))
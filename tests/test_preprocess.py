@@ -0,0 +1,20 @@
+import os
+
+from preprocess import ArtifactStore, build_settings, preprocess_corpus
+
+DOCS = [("a", "The harbour opened in spring. Ships came from the north. Trade grew quickly."),
+        ("b", "The castle stands on a hill. Its walls are old. Visitors climb the tower.")]
+
+
+def test_settings_change_rebuilds(stub_models, tmp_path):
+    root = str(tmp_path)
+    assert preprocess_corpus(DOCS, root, segmenter="rule", ladder=None) == {"a": True, "b": True}
+    assert preprocess_corpus(DOCS, root, segmenter="rule", ladder=None) == {"a": False, "b": False}
+    store = ArtifactStore(root)
+    assert store.is_current("a", DOCS[0][1], build_settings("rule", None))
+    assert not store.is_current("a", DOCS[0][1], build_settings("window", None))
+    assert not store.is_current("a", DOCS[0][1], build_settings("rule", (("short", (20, 5)),)))
+    assert preprocess_corpus(DOCS, root, segmenter="window", ladder=None) == {"a": True, "b": True}
+    art = store.get("a")
+    assert art.manifest["segmenter"] == "window" and art.manifest["ladder"] is None
+    assert sorted(os.listdir(root)) == ["a", "b"]  # no temporary or set-aside directories left
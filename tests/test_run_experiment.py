@@ -0,0 +1,174 @@
+import numpy as np
+import pytest
+
+import model_registry
+import run_experiment
+from online_update import OnlineScorer
+from results_store import ResultStore, config_hash
+from scoring import compute_importance
+from segmentation import segment_text
+from selection import select_table_multi
+from utils import count_tokens, get_token_counter, set_token_counter
+
+SEGMENTS = ["Paris is the capital of France.", "The Seine flows through Paris.",
+            "Lyon lies to the south.", "Bordeaux is known for wine.", "Nice is on the coast."]
+
+
+@pytest.fixture
+def llm_state():
+    """Unloaded LLM for the test; registry and token counter are restored afterwards."""
+    state, counter = model_registry.snapshot(), get_token_counter()
+    model_registry.reset("llm")
+    yield
+    model_registry.restore(state)
+    set_token_counter(counter)
+
+
+@pytest.fixture
+def heuristic_llm(llm_state):
+    model_registry.override("llm", (None, None))
+
+
+class _Tokenizer:
+    name_or_path = run_experiment.LLM_NAME
+
+
+def _fail_to_load(name):
+    raise OSError(f"{name} is not available")
+
+
+def test_config_records_the_llm_that_loaded(monkeypatch, llm_state):
+    monkeypatch.setattr(run_experiment, "load_model", _fail_to_load)
+    fallback = run_experiment.run_config()
+    assert fallback["llm"] == "heuristic" and fallback["token_counter"] == "whitespace"
+
+    model_registry.reset("llm")
+    monkeypatch.setattr(run_experiment, "load_model", lambda name: (object(), _Tokenizer()))
+    loaded = run_experiment.run_config()
+    assert loaded["llm"] == loaded["token_counter"] == run_experiment.LLM_NAME
+    assert config_hash(fallback) != config_hash(loaded)
+
+
+@pytest.mark.parametrize("gold", ["paris", "is"])
+def test_scorer_feedback_rewards_are_balanced_and_bounded(monkeypatch, gold):
+    updates = []
+    monkeypatch.setattr(OnlineScorer, "update_file", staticmethod(lambda path, f, r: updates.append(r)))
+    run_experiment._scorer_feedback(np.zeros((len(SEGMENTS), 3)), SEGMENTS, gold)
+    (reward,) = updates
+    assert np.abs(reward).max() == 1.0
+    assert reward[reward > 0].sum() == pytest.approx(-reward[reward < 0].sum())
+
+
+def test_compute_importance_returns_scorer_features(stub_models):
+    scorer = OnlineScorer()
+    scores, features = compute_importance(SEGMENTS, "capital of France", scorer=scorer, return_features=True)
+    np.testing.assert_allclose(scores, compute_importance(SEGMENTS, "capital of France", scorer=scorer))
+    np.testing.assert_allclose(scores, scorer.score_features(features))
+
+
+def _fake_qa_example(ex, budgets):
+    """Picklable stand-in for qa_example (spawned workers import it from this module)."""
+    score = float(ex["id"] == "q1")
+    return {B: {m: {"em": score, "f1": score} for m in run_experiment._qa_methods()} for B in budgets}
+
+
+def _no_models():
+    pass
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_qa_experiment_resumes_through_the_pool(monkeypatch, heuristic_llm, workers):
+    monkeypatch.setattr(run_experiment, "iter_hotpotqa",
+                        lambda n: iter([{"id": f"q{i}", "query": "q", "context": "c", "answer": "a"} for i in range(n)]))
+    monkeypatch.setattr(run_experiment, "qa_example", _fake_qa_example)
+    monkeypatch.setattr(run_experiment, "load_models", _no_models)
+    store = ResultStore()
+    config = store.register_config(run_experiment.run_config())
+    store.put("hotpotqa", config, "q0", _fake_qa_example({"id": "q0"}, [100]))  # stored by an earlier run
+
+    summary = run_experiment.run_qa_experiment_budgets([100, 200], n=4, workers=workers, store=store)
+    assert len(store) == 4 * 2 * len(run_experiment._qa_methods())
+    assert summary[100]["BPO"] == summary[200]["BPO"] == (25.0, 25.0)
+
+
+def _must_not_run(*args, **kwargs):
+    raise AssertionError("nothing is pending: no models or workers needed")
+
+
+def test_complete_rerun_loads_nothing(monkeypatch, heuristic_llm):
+    store = ResultStore()
+    config = store.register_config(run_experiment.run_config())
+    qa = [{"id": f"q{i}", "query": "q", "context": "c", "answer": "a"} for i in range(3)]
+    docs = [{"id": f"d{i}", "report": "r", "summary": "s"} for i in range(3)]
+    metrics = {"rouge1": 0.5, "rouge2": 0.25, "rougeL": 0.5, "bert": 0.9}
+    for ex in qa:
+        store.put("hotpotqa", config, ex["id"], _fake_qa_example(ex, [100]))
+    for ex in docs:
+        store.put("govreport", config, ex["id"], {100: {m: metrics for m in run_experiment.SUM_METHODS}})
+    monkeypatch.setattr(run_experiment, "iter_hotpotqa", lambda n: iter(qa))
+    monkeypatch.setattr(run_experiment, "iter_govreport", lambda n: iter(docs))
+    monkeypatch.setattr(run_experiment, "load_models", _must_not_run)
+    monkeypatch.setattr(run_experiment, "map_examples", _must_not_run)
+
+    qa_summary = run_experiment.run_qa_experiment_budgets([100], n=3, workers=2, store=store)
+    assert qa_summary[100]["BPO"] == pytest.approx((100 / 3, 100 / 3))
+    sum_summary = run_experiment.run_summarization_experiment_budgets([100], n=3, workers=2, store=store)
+    assert sum_summary[100]["BPO"] == pytest.approx((50.0, 25.0, 50.0, 0.9))
+
+
+def _dedup_flag_example(ex, budgets):
+    """Reports the DEDUP setting the (worker) process sees as the score."""
+    score = float(run_experiment.DEDUP)
+    return {B: {m: {"em": score, "f1": score} for m in run_experiment._qa_methods()} for B in budgets}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_workers_see_runtime_settings(monkeypatch, heuristic_llm, workers):
+    monkeypatch.setattr(run_experiment, "iter_hotpotqa",
+                        lambda n: iter([{"id": f"q{i}", "query": "q", "context": "c", "answer": "a"} for i in range(n)]))
+    monkeypatch.setattr(run_experiment, "qa_example", _dedup_flag_example)
+    monkeypatch.setattr(run_experiment, "load_models", _no_models)
+    monkeypatch.setattr(run_experiment, "DEDUP", not run_experiment.DEDUP)
+    expected = 100.0 * run_experiment.DEDUP
+    summary = run_experiment.run_qa_experiment_budgets([100], n=3, workers=workers)
+    assert summary[100]["BPO"] == (expected, expected)
+
+
+TOPICS = ["harbour trade", "castle siege", "river floods", "market prices", "bridge tolls", "garden roses",
+          "mill wheels", "abbey bells", "forest paths", "mine shafts"]
+DOCUMENT = " ".join(f"The {topic} of the old town were recorded in detail by clerk {i}, who noted every "
+                    f"change over {i + 2} winters and wrote long letters about the {topic} to the council."
+                    for i, topic in enumerate(TOPICS * 2))
+LADDER_BUDGETS = [30, 120, 400]
+
+
+@pytest.mark.parametrize("method", ["greedy", "dp", "fptas", "lp"])
+def test_ladder_selection_picks_one_rung_within_budget(stub_models, monkeypatch, method):
+    monkeypatch.setattr(run_experiment, "BPO_METHOD", method)
+    segments = segment_text(DOCUMENT)
+    importance = compute_importance(segments, "What happened to the river floods and the bridge tolls?")
+    assert (importance > 0).any()
+    table = run_experiment._build_table(segments, importance)
+    assert table.rungs == tuple(name for name, _ in run_experiment.COMPRESSION_LADDER) + ("full",)
+    costs = table.costs()
+    selected = select_table_multi(table, LADDER_BUDGETS, method=method, return_info=True)
+    for B, (ids, modes, cost, value, info) in selected.items():
+        assert len(ids) and len(set(ids.tolist())) == len(ids)  # at most one rung per segment
+        assert ((0 <= modes) & (modes < len(table.rungs))).all()
+        assert cost == costs[ids, modes].sum() <= B
+        if method != "greedy":  # knapsack solvers lose at most one item against the LP bound
+            assert value >= info["bound"] - importance.max() - 1e-9
+
+    _, _, bpo, _ = run_experiment._summaries_and_bpo(segments, importance, LADDER_BUDGETS)
+    for B, (text, cost) in bpo.items():
+        assert count_tokens(text) == cost <= B
+
+
+def test_lazy_ladder_selection_within_budget(stub_models, monkeypatch):
+    monkeypatch.setattr(run_experiment, "LAZY_SUMMARIES", True)
+    segments = segment_text(DOCUMENT)
+    importance = compute_importance(segments, "What happened to the river floods and the bridge tolls?")
+    _, summary, bpo, _ = run_experiment._summaries_and_bpo(segments, importance, LADDER_BUDGETS)
+    for B in LADDER_BUDGETS:
+        assert count_tokens(bpo[B][0]) == bpo[B][1] <= B
+        assert count_tokens(summary[B][0]) == summary[B][1] <= B
@@ -0,0 +1,28 @@
+import pytest
+
+import model_registry
+from scoring import summarize_segments
+
+
+class _Recorder:
+    """Wraps the stub summarizer, recording the segments and pipeline batch_size of each call."""
+
+    def __init__(self):
+        self.calls = []
+        self.summarize = model_registry.get("summarizer")
+
+    def __call__(self, inputs, **kwargs):
+        self.calls.append((1 if isinstance(inputs, str) else len(inputs), kwargs.get("batch_size")))
+        return self.summarize(inputs, **kwargs)
+
+
+@pytest.mark.parametrize("batch_size", [1, 3, 64])
+def test_batched_summaries_match_per_segment(stub_models, batch_size):
+    # lengths span the raw (< 20 words) case and several adaptive max/min buckets
+    segments = [" ".join(f"w{i}_{j}" for j in range(n)) for i, n in enumerate([5, 25, 80, 19, 30, 200, 25, 60, 80])]
+    single, batched = _Recorder(), _Recorder()
+    expected = summarize_segments(segments, cache=None, summarize=single)
+    assert summarize_segments(segments, cache=None, batch_size=batch_size, summarize=batched) == expected
+    assert single.calls == [(1, None)] * 7
+    # one pipeline call per adaptive (max, min) bucket, chunked by the pipeline's batch_size
+    assert sorted(batched.calls) == [(1, batch_size), (1, batch_size), (2, batch_size), (3, batch_size)]
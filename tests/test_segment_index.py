@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+
+from segment_index import IndexCache, SegmentIndex, index_key
+
+
+def _encode(texts):
+    return np.ones((len(texts), 8), dtype=np.float32)
+
+
+def test_empty_index_scores_empty():
+    index = SegmentIndex.build([], _encode, str.split)
+    assert len(index) == 0
+    assert index.score("any query", _encode, str.split).shape == (0,)
+
+
+SEGMENTS = [f"segment {i} about {word} and {word}s" for i, word in
+            enumerate(["cats", "dogs", "birds", "fish", "cats dogs", "trees"] * 20)]
+
+
+def _embed(texts):
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(len(texts), 16)).astype(np.float32)
+
+
+def test_bm25_subset_matches_full():
+    index = SegmentIndex.build(SEGMENTS, _embed, str.split)
+    query = "cats and dogs cats".split()
+    ids = np.array([5, 0, 119, 42, 4, 4])
+    np.testing.assert_allclose(index.bm25_scores(query, ids=ids), index.bm25_scores(query)[ids])
+    assert index.bm25_scores(["unknown"], ids=ids).tolist() == [0.0] * len(ids)
+
+
+def test_ann_index_is_persisted(tmp_path):
+    path = str(tmp_path / "index")
+    SegmentIndex.build(SEGMENTS, _embed, str.split).save(path)
+    loaded = SegmentIndex.load(path)
+    ann = loaded.ann_index()
+    reloaded = SegmentIndex.load(path)
+    assert reloaded._ann is not None
+    np.testing.assert_array_equal(reloaded._ann.list_ids, ann.list_ids)
+
+
+def test_index_cache_disk_is_bounded(tmp_path):
+    probe = tmp_path / "probe"
+    SegmentIndex.build(SEGMENTS, _embed, str.split).save(str(probe))
+    size = sum(f.stat().st_size for f in probe.rglob("*") if f.is_file())
+    cache = IndexCache(str(tmp_path / "cache"), max_memory_items=1, max_disk_bytes=int(2.5 * size))
+    docs = [SEGMENTS[i:] for i in range(6)]
+    for doc in docs:
+        cache.get_or_build(doc, _embed, str.split, "m")
+    stored = os.listdir(os.path.join(str(tmp_path / "cache"), "index"))
+    assert 1 <= len(stored) <= 2
+    assert index_key(docs[-1], "m") in stored  # the newest index is kept
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from baselines import all_summaries, full_context, oracle_selection, retrieval_topk, truncation
+from segment_table import SegmentTable
+from selection import budgeted_selection, select_table
+from utils import count_tokens_batch
+
+SEGMENTS = [f"Segment {i} talks about {topic} near the {place}." for i, (topic, place) in
+            enumerate([("trade", "harbour"), ("war", "castle"), ("floods", "river"), ("prices", "market"),
+                       ("tolls", "bridge"), ("roses", "garden"), ("naïve café", "square"), ("", "end")] * 3)]
+SUMMARIES = [" ".join(s.split()[:3]) for s in SEGMENTS]
+IMPORTANCE = np.linspace(1.0, 0.1, len(SEGMENTS))[np.random.default_rng(0).permutation(len(SEGMENTS))]
+
+
+def _old_prompt(chosen):
+    """Prompt text of the list-of-dicts selection, as assembled before SegmentTable."""
+    return " ".join(SEGMENTS[c["id"]] if c["mode"] == "full" else SUMMARIES[c["id"]] for c in chosen)
+
+
+def test_from_rungs_round_trip():
+    texts = [["", "kw"] * 2, SUMMARIES[:4], SEGMENTS[:4]]
+    table = SegmentTable.from_rungs(texts, ["keywords", "summary", "full"], IMPORTANCE[:4])
+    assert len(table) == 4 and table.rungs == ("keywords", "summary", "full")
+    for r, rung in enumerate(texts):
+        assert [table.text(r, i) for i in range(4)] == rung
+        assert table.rung_costs[r].tolist() == count_tokens_batch(rung)
+    assert table.segments() == SEGMENTS[:4] and table.summaries() == SUMMARIES[:4]
+    assert table.gather([2, 3, 0], [0, 0, 2], sep="|") == f"|kw|{SEGMENTS[0]}"
+    assert table.gather([]) == ""
+
+
+@pytest.mark.parametrize("method", ["greedy", "dp", "fptas", "lp"])
+@pytest.mark.parametrize("B", [0, 17, 60, 1000])
+def test_table_selection_matches_list_of_dicts(method, B):
+    chosen, cost, value = budgeted_selection(SEGMENTS, SUMMARIES, IMPORTANCE, B, method=method)
+    table = SegmentTable.from_lists(SEGMENTS, SUMMARIES, IMPORTANCE)
+    ids, modes, t_cost, t_value = select_table(table, B, method=method)
+    assert [(c["id"], c["mode"]) for c in chosen] == [(i, table.rungs[m]) for i, m in zip(ids, modes)]
+    assert (t_cost, t_value) == (cost, pytest.approx(value))
+    assert table.gather(ids, modes) == _old_prompt(chosen)
+    sel_ids, sel_modes = table.selected()
+    assert sorted(zip(ids.tolist(), modes.tolist())) == list(zip(sel_ids.tolist(), sel_modes.tolist()))
+
+
+@pytest.mark.parametrize("B", [0, 10, 45, 1000])
+def test_baselines_on_table_match_lists(B):
+    table = SegmentTable.from_lists(SEGMENTS, SUMMARIES, IMPORTANCE)
+    assert full_context(table, B) == full_context(SEGMENTS, B)
+    assert truncation(table, B) == truncation(SEGMENTS, B)
+    assert retrieval_topk(table, IMPORTANCE, B) == retrieval_topk(SEGMENTS, IMPORTANCE, B)
+    assert all_summaries(table, B) == all_summaries(SUMMARIES, B)
+    assert oracle_selection(table, ["café"], B) == oracle_selection(SEGMENTS, ["café"], B)
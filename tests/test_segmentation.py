@@ -0,0 +1,29 @@
+import pytest
+
+from segmentation import iter_segments
+
+
+@pytest.mark.parametrize("chunk_size", [5, 20, 64, 333])
+@pytest.mark.parametrize("backend", ["rule", "window"])
+def test_forced_cut_with_trailing_whitespace(chunk_size, backend):
+    text = "word " * 1000
+    segments = list(iter_segments(text, backend=backend, chunk_size=chunk_size))
+    assert " ".join(seg for seg, _, _ in segments).split() == text.split()
+    assert all(text[start:end] == seg for seg, start, end in segments if backend == "rule")
+
+
+@pytest.mark.parametrize("chunk_size", [16, 1 << 16])
+def test_window_offsets(chunk_size):
+    # short paragraphs are merged across their breaks
+    text = "\n\n".join(f"Sentence {i} has  a few\nwords.  Another one." for i in range(20))
+    text += "\n\n" + "Long " * 300 + "end."
+    sentences = list(iter_segments(text, backend="rule", chunk_size=chunk_size))
+    windows = list(iter_segments(text, backend="window", target_tokens=40, chunk_size=chunk_size))
+    assert len(windows) > 1 and any(seg != text[start:end] for seg, start, end in windows)
+    assert all(e1 <= s2 for (_, _, e1), (_, s2, _) in zip(windows, windows[1:]))
+    for seg, start, end in windows:
+        inside = [s for s, a, b in sentences if start <= a and b <= end]
+        if inside:  # merged sentences: their text joined by single spaces
+            assert seg == " ".join(inside)
+        else:  # a word window of an over-long sentence is a verbatim slice
+            assert seg == text[start:end]
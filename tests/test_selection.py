@@ -0,0 +1,55 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from selection import lp_bound, lp_bounds, solve_mckp, solve_mckp_multi
+
+
+@pytest.mark.parametrize("method", ["dp", "fptas", "lp"])
+def test_no_budgets(method):
+    assert solve_mckp_multi(np.ones((3, 2)), np.ones((3, 2), dtype=np.int64), [], method=method) == {}
+
+
+def test_shared_lp_bounds_match_single():
+    rng = np.random.default_rng(0)
+    values, costs = rng.random((50, 3)), rng.integers(1, 40, (50, 3))
+    budgets = [10, 100, 400, 5000]
+    assert lp_bounds(values, costs, budgets) == {B: lp_bound(values, costs, B) for B in budgets}
+    for B, sol in solve_mckp_multi(values, costs, budgets, method="fptas").items():
+        assert sol["bound"] == lp_bound(values, costs, B)
+
+
+def _brute_force(values, costs, B):
+    """Best value over every choice of at most one option per group."""
+    n, k = values.shape
+    best = 0.0
+    for choice in itertools.product(range(-1, k), repeat=n):
+        picked = [(i, c) for i, c in enumerate(choice) if c >= 0]
+        if sum(costs[i, c] for i, c in picked) <= B:
+            best = max(best, sum(values[i, c] for i, c in picked))
+    return best
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_solvers_against_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    eps = 0.3
+    for _ in range(100):
+        n, k = int(rng.integers(1, 6)), int(rng.integers(1, 4))
+        values = rng.random((n, k)) * 10
+        costs = rng.integers(0, 60, (n, k))
+        B = int(rng.integers(0, 200))
+        opt = _brute_force(values, costs, B)
+        for method in ("dp", "fptas", "lp"):
+            sol = solve_mckp(values, costs, B, method=method, eps=eps)
+            choice = sol["choice"]
+            picked = np.flatnonzero(choice >= 0)
+            assert choice.shape == (n,) and choice.max(initial=-1) < k
+            assert sol["cost"] == costs[picked, choice[picked]].sum() <= B
+            assert sol["value"] == pytest.approx(values[picked, choice[picked]].sum())
+            assert sol["value"] <= opt + 1e-9
+            assert sol["bound"] >= opt - 1e-9  # the LP relaxation bounds every solution
+        assert solve_mckp(values, costs, B, method="dp")["value"] == pytest.approx(opt)
+        fptas = solve_mckp(values, costs, B, method="fptas", eps=eps)["value"]
+        assert fptas >= _brute_force(values, costs, int((1 - eps) * B)) - 1e-9
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import pytest
+
+from segmentation import segment_text
+from service import PrefillService, _route
+
+DOCUMENT = " ".join(f"Part {i} describes the {topic} in some detail." for i, topic in
+                    enumerate(["harbour", "castle", "river", "market", "bridge", "garden"] * 6))
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+async def _requests(bodies, **kwargs):
+    service = PrefillService(**kwargs)
+    await service.start(load=False)
+    try:
+        return [await _route(service, "POST", "/prefill", json.dumps(body).encode()) for body in bodies] \
+            + [await _route(service, "GET", "/health", b"")]
+    finally:
+        await service.close()
+
+
+@pytest.mark.parametrize("method", ["lazy", "fptas"])
+def test_prefill_within_budget(stub_models, method):
+    body = {"document": DOCUMENT, "query": "Where is the castle?", "budget": 60, "method": method}
+    (status, first), (_, second), (health_status, health) = _run(_requests([body, body]))
+    assert status == 200 and health_status == 200
+    assert 0 < first["cost"] <= 60
+    assert first["prompt"] and first["selected"]
+    assert all(0 <= i < first["n_segments"] for i, _ in first["selected"])
+    assert second["prompt"] == first["prompt"]
+    assert second["summarized"] == 0  # every summary is a cache hit now
+    assert health["requests"] == 2 and health["errors"] == 0
+
+
+@pytest.mark.parametrize("document", ["", "   \n\t "])
+def test_empty_document(stub_models, document):
+    (status, resp), _ = _run(_requests([{"document": document, "query": "q", "budget": 100}]))
+    assert status == 200
+    assert resp["prompt"] == "" and resp["cost"] == 0 and resp["selected"] == []
+
+
+def test_bad_requests(stub_models):
+    (unknown, resp), (missing, _), _ = _run(_requests([
+        {"document": DOCUMENT, "query": "q", "budget": 100, "method": "nope"},
+        {"document": DOCUMENT, "query": "q"},
+    ]))
+    assert unknown == 400 and "unknown method" in resp["error"]
+    assert missing == 400
+
+
+def test_dedup_reports_original_ids(stub_models):
+    sentences = segment_text(DOCUMENT)
+    document = " ".join(s for sentence in sentences for s in (sentence, sentence))  # each one twice in a row
+    body = {"document": document, "query": "Where is the castle?", "budget": 60, "method": "fptas"}
+    (status, resp), _ = _run(_requests([body], dedup=True))
+    assert status == 200 and resp["n_unique"] * 2 == resp["n_segments"]
+    segments = segment_text(document)
+    assert resp["selected"] and all(i % 2 == 0 for i, _ in resp["selected"])  # first of each pair
+    for i, rung in resp["selected"]:
+        if rung == "full":
+            assert segments[i] in resp["prompt"]
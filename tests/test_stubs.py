@@ -0,0 +1,19 @@
+import model_registry
+from complexity import run_benchmarks
+from stubs import stubbed_models
+
+
+def test_stubbed_models_restores_registry():
+    before = model_registry.snapshot()
+    with stubbed_models():
+        assert model_registry.fingerprint("embedder", "real").startswith("override:")
+    assert model_registry.snapshot() == before
+    assert model_registry.fingerprint("embedder", "real") == "real"
+
+
+def test_benchmarks_leave_registry_untouched():
+    before = model_registry.snapshot()
+    report = run_benchmarks(n_segments=(20, 40), seg_lengths=(), budgets=(), repeat=1, out_path=None,
+                            summary_batch_size=4)
+    assert model_registry.snapshot() == before
+    assert report["meta"]["summary_batch_size"] == 4
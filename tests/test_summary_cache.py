@@ -0,0 +1,9 @@
+from summary_cache import SummaryCache
+
+
+def test_overwrite_keeps_disk_size(tmp_path):
+    cache = SummaryCache(cache_dir=str(tmp_path), max_disk_bytes=10_000)
+    cache.put("ab" + "0" * 62, "x" * 100)
+    for _ in range(5):
+        cache.put("ab" + "0" * 62, "y" * 100)
+    assert cache._disk_bytes == cache._scan_size() == 100
@@ -0,0 +1,32 @@
+import threading
+
+from utils import TokenCounter
+
+
+def test_counts_and_cap():
+    counter = TokenCounter(max_cache_items=10)
+    texts = [("w " * i).strip() for i in range(25)]
+    assert counter.count_batch(texts) == list(range(25))
+    assert len(counter._cache) <= 10
+    assert counter.count("a b c") == 3
+    assert all(isinstance(k, bytes) and len(k) == 16 for k in counter._cache)
+
+
+def test_shared_between_threads():
+    counter = TokenCounter(max_cache_items=50)
+    errors = []
+
+    def work(seed):
+        try:
+            for r in range(200):
+                texts = [("x " * ((seed * 7 + r + j) % 90 + 1)).strip() for j in range(20)]
+                assert counter.count_batch(texts) == [len(t.split()) for t in texts]
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors